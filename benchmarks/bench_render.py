@@ -0,0 +1,260 @@
+"""Benchmark Work Instruction rendering across synthetic specs.
+
+    python benchmarks/bench_render.py                      # full matrix
+    python benchmarks/bench_render.py --steps 1 20 --images none small
+    python benchmarks/bench_render.py -o new.json --compare old.json
+
+Each case is a synthetic spec with N procedure steps, optional step pictures of
+a given size, every default clause filled in, two extra clauses and all PPEs
+selected. Every backend is timed phase by phase (best of ``--repeat`` runs),
+then run once more under tracemalloc for the peak Python memory of each phase.
+Documents are written to the same spooled output files the app uses. The peak
+RSS of each phase is recorded as well; it covers memory tracemalloc cannot
+see (Pillow's decoders, lxml) and is exact on Linux, where the high-water
+mark can be reset between phases. Elsewhere it is the process's peak so far.
+The results go to a JSON file that ``--compare`` can diff against an earlier
+run; it exits non-zero when a phase got slower than ``--threshold``.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image
+
+import wi_fragments
+import wi_images
+from wi_pdf import render_pdf
+from wi_output import spooled_output
+from wi_render import DEFAULT_CLAUSES, PPE_OPTIONS, RenderOptions, WorkInstructionSpec, build_document
+from wi_stream import write_docx
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STEP_COUNTS = [1, 20, 200, 2000]
+IMAGE_SIZES = {
+    "none": None,
+    "small": (640, 480),
+    "large": (4000, 3000),
+}
+BACKENDS = ["classic", "styled", "stream", "pdf"]
+# Distinct pictures per case; steps cycle through them like reused photos would
+IMAGE_POOL = 8
+
+
+def synthetic_images(size):
+    if size is None:
+        return []
+    images = []
+    for i in range(IMAGE_POOL):
+        im = Image.effect_noise(size, 40 + i * 10).convert("RGB")
+        out = BytesIO()
+        im.save(out, "JPEG", quality=90)
+        images.append(out.getvalue())
+    return images
+
+
+def synthetic_spec(num_steps, images):
+    steps = [
+        {
+            "detail": f"Step {n+1}: check the burner pressure on line {n % 4 + 1}\nRecord the reading in the log sheet.",
+            "images": [images[n % len(images)], images[(n + 1) % len(images)]] if images else [None, None],
+        }
+        for n in range(num_steps)
+    ]
+    clauses = []
+    for title in DEFAULT_CLAUSES:
+        if title == "Resources required":
+            clauses.append((title, {"machine": "Furnace burner panel", "material": "Cullet, soda ash", "man": "2 operators"}))
+        elif title == "Procedure steps":
+            clauses.append((title, steps))
+        else:
+            clauses.append((title, f"{title} for the synthetic benchmark work instruction. " * 3))
+    clauses += [("Extra clause A", "Additional notes."), ("Extra clause B", "More notes.")]
+    return WorkInstructionSpec(
+        title="Benchmark WI", department="Furnace", doc_no="FUR/L3/999",
+        issue_date="2026-01-01", rev_no="00", rev_date="2026-01-01", clauses=clauses,
+        ppe_selected=[ppe["name"] for ppe in PPE_OPTIONS], prep_by="A", review_by="B", approve_by="C",
+    )
+
+
+def reset_peak_rss():
+    # Linux: restarts the VmHWM high-water mark at the current RSS
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """Peak resident set size in bytes, or None where it cannot be read."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_backend(backend, spec):
+    """Return the ``(phase name, callable)`` list for one render and the state it fills in."""
+    state = {}
+
+    def build():
+        state["doc"] = build_document(spec, RenderOptions(styled=backend == "styled"))
+
+    def save():
+        with spooled_output() as out:
+            state.pop("doc").save(out)
+            state["size"] = out.tell()
+
+    def stream():
+        with spooled_output() as out:
+            write_docx(spec, out)
+            state["size"] = out.tell()
+
+    def pdf():
+        with spooled_output() as out:
+            render_pdf(spec, out=out)
+            state["size"] = out.tell()
+
+    if backend in ("classic", "styled"):
+        return [("build", build), ("save", save)], state
+    if backend == "stream":
+        return [("write", stream)], state
+    return [("render", pdf)], state
+
+
+def measure(backend, spec, repeat):
+    timings = {}
+    for _ in range(repeat):
+        # Every run starts cold so picture processing and clause rendering are part of the measurement
+        wi_images.clear_cache()
+        wi_fragments.clear_fragment_cache()
+        phases, state = run_backend(backend, spec)
+        for name, fn in phases:
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+            timings[name] = min(timings.get(name, elapsed), elapsed)
+
+    wi_images.clear_cache()
+    wi_fragments.clear_fragment_cache()
+    rss = {}
+    phases, state = run_backend(backend, spec)
+    for name, fn in phases:
+        reset_peak_rss()
+        fn()
+        rss[name] = peak_rss()
+
+    wi_images.clear_cache()
+    wi_fragments.clear_fragment_cache()
+    peaks = {}
+    phases, state = run_backend(backend, spec)
+    tracemalloc.start()
+    for name, fn in phases:
+        tracemalloc.reset_peak()
+        fn()
+        peaks[name] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "phases": {name: {"seconds": round(timings[name], 6), "peak_bytes": peaks[name], "peak_rss_bytes": rss[name]}
+                   for name in timings},
+        "total_seconds": round(sum(timings.values()), 6),
+        "output_bytes": state["size"],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {case["id"]: case for case in json.load(f)["cases"]}
+    regressions = []
+    for case in results["cases"]:
+        old = baseline.get(case["id"])
+        if old is None:
+            continue
+        for phase, stats in case["phases"].items():
+            old_stats = old["phases"].get(phase)
+            if old_stats and old_stats["seconds"] > 0:
+                ratio = stats["seconds"] / old_stats["seconds"]
+                if ratio > threshold:
+                    regressions.append((case["id"], phase, old_stats["seconds"], stats["seconds"], ratio))
+    for case_id, phase, old, new, ratio in regressions:
+        print(f"REGRESSION {case_id} [{phase}]: {old*1000:.1f} ms -> {new*1000:.1f} ms ({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Work Instruction rendering.")
+    parser.add_argument("--steps", type=int, nargs="+", default=STEP_COUNTS, help="procedure step counts")
+    parser.add_argument("--images", nargs="+", choices=list(IMAGE_SIZES), default=list(IMAGE_SIZES),
+                        help="step picture sizes")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case (best is kept)")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio treated as a regression")
+    args = parser.parse_args(argv)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": [],
+    }
+    for image_kind in args.images:
+        images = synthetic_images(IMAGE_SIZES[image_kind])
+        for num_steps in args.steps:
+            spec = synthetic_spec(num_steps, images)
+            for backend in args.backends:
+                case = {"id": f"{backend}/steps={num_steps}/images={image_kind}",
+                        "backend": backend, "steps": num_steps, "images": image_kind}
+                case.update(measure(backend, spec, args.repeat))
+                results["cases"].append(case)
+                phases = "  ".join(
+                    f"{name} {stats['seconds']*1000:8.1f} ms {stats['peak_bytes']/1e6:7.1f} MB"
+                    + (f" rss {stats['peak_rss_bytes']/1e6:7.1f} MB" if stats["peak_rss_bytes"] else "")
+                    for name, stats in case["phases"].items()
+                )
+                print(f"{case['id']:<36} {phases}  out {case['output_bytes']/1e3:9.1f} KB", flush=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
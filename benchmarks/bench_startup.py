@@ -0,0 +1,89 @@
+"""Benchmark the cold start of the Streamlit app.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py -o new.json --compare old.json
+
+Every run starts a fresh interpreter, runs the app script once with
+Streamlit's ``AppTest`` against an empty repository and waits for the
+background warm-up. It records the times ``wi_startup`` logs in production:
+the app's imports, the first complete page and the warm-up of the renderers.
+The best of ``--repeat`` runs is kept. Results and ``--compare`` work like
+``bench_render.py``.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+APP = os.path.join(ROOT, "work_instruction_app.py")
+
+
+def child():
+    from streamlit.testing.v1 import AppTest
+
+    with tempfile.TemporaryDirectory(prefix="wi_bench_repo_") as repo_dir:
+        os.environ["WI_REPO_DIR"] = repo_dir
+        at = AppTest.from_file(APP, default_timeout=120)
+        at.run()
+        if at.exception:
+            raise SystemExit(f"app failed: {at.exception[0].message}")
+        for thread in threading.enumerate():
+            if thread.name == "wi-warm-up":
+                thread.join()
+        import wi_startup
+        print(json.dumps(wi_startup.startup_times()))
+
+
+def cold_start():
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], cwd=ROOT, capture_output=True,
+                         text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the cold start of the Streamlit app.")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes to start (best is kept)")
+    parser.add_argument("-o", "--output", default="bench_startup.json", help="JSON results file")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio treated as a regression")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        child()
+        return 0
+    # Not imported at the top: it loads the renderers, which would spoil the child's cold start
+    from bench_render import compare, git_commit
+
+    best = {}
+    for _ in range(args.repeat):
+        for name, ms in cold_start().items():
+            best[name] = min(best.get(name, ms), ms)
+    case = {"id": "app/cold-start", "phases": {name[:-3]: {"seconds": ms / 1000} for name, ms in best.items()}}
+    print("  ".join(f"{name} {stats['seconds']*1000:7.1f} ms" for name, stats in case["phases"].items()))
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": [case],
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Render a directory of Work Instruction specs in parallel.
+
+    python wi_batch.py specs/ -o out/ --workers 8
+
+Every ``*.json``, ``*.yaml`` and ``*.yml`` file in the spec directory is
+rendered to ``<out>/<spec name>.docx`` (or ``.pdf`` with ``--format pdf``). A spec that fails to load or render is
+reported and skipped; the rest of the batch carries on.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from wi_images import DEFAULT_DPI
+from wi_pdf import render_pdf
+from wi_render import RenderOptions, load_spec, render_docx
+from wi_stream import write_docx
+
+SPEC_EXTENSIONS = (".json", ".yaml", ".yml")
+
+
+def find_specs(spec_dir):
+    return sorted(
+        os.path.join(spec_dir, name)
+        for name in os.listdir(spec_dir)
+        if name.lower().endswith(SPEC_EXTENSIONS)
+    )
+
+
+def render_spec_file(spec_path, out_dir, options=None, stream=False, fmt="docx"):
+    # Runs in a worker process; any exception is returned to the parent as text
+    # so one broken spec cannot take the pool down.
+    try:
+        spec = load_spec(spec_path)
+        out_path = os.path.join(out_dir, os.path.splitext(os.path.basename(spec_path))[0] + "." + fmt)
+        if fmt == "docx" and stream:
+            write_docx(spec, out_path, options)
+        else:
+            data = render_pdf(spec, options) if fmt == "pdf" else render_docx(spec, options)
+            with open(out_path, "wb") as f:
+                f.write(data)
+        return spec_path, out_path, None
+    except Exception as exc:
+        return spec_path, None, f"{type(exc).__name__}: {exc}"
+
+
+def run_batch(spec_paths, out_dir, workers=None, options=None, stream=False, fmt="docx"):
+    """Render ``spec_paths`` across a process pool.
+
+    Returns ``(results, elapsed)`` where results is a list of
+    ``(spec_path, out_path, error)`` tuples in completion order.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_spec_file, path, out_dir, options, stream, fmt) for path in spec_paths]
+        for future in as_completed(futures):
+            results.append(future.result())
+    return results, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render Work Instruction specs to DOCX in parallel.")
+    parser.add_argument("spec_dir", help="directory containing JSON/YAML specs")
+    parser.add_argument("-o", "--out-dir", default="out", help="output directory (default: out)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI,
+                        help=f"print resolution for step pictures, 0 to embed originals (default: {DEFAULT_DPI})")
+    parser.add_argument("--styled", action="store_true",
+                        help="reference named styles instead of formatting every run (smaller, faster output)")
+    parser.add_argument("--stream", action="store_true",
+                        help="write through the streaming backend (styled output, flat memory for huge procedures)")
+    parser.add_argument("-f", "--format", choices=["docx", "pdf"], default="docx", help="output format (default: docx)")
+    args = parser.parse_args(argv)
+
+    spec_paths = find_specs(args.spec_dir)
+    if not spec_paths:
+        print(f"No specs found in {args.spec_dir}", file=sys.stderr)
+        return 1
+
+    options = RenderOptions(image_dpi=args.dpi or None, styled=args.styled or args.stream)
+    results, elapsed = run_batch(spec_paths, args.out_dir, args.workers, options, args.stream, args.format)
+    failures = [(path, error) for path, _, error in results if error]
+    for path, error in failures:
+        print(f"FAILED {path}: {error}", file=sys.stderr)
+    rendered = len(results) - len(failures)
+    rate = rendered / elapsed if elapsed else 0.0
+    print(f"Rendered {rendered}/{len(results)} documents in {elapsed:.2f}s ({rate:.1f} docs/s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
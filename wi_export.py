@@ -0,0 +1,141 @@
+"""Bulk export of saved Work Instructions into one ZIP archive.
+
+    python wi_export.py --department Furnace -o furnace.zip
+    python wi_export.py --prefix FUR/L3/ --from 1 --to 50 -f pdf -o fur-l3.zip
+    python wi_export.py --department Furnace --classic -o furnace.zip
+
+Documents are selected from the repository (see ``wi_repository``) by
+department or by doc number prefix and range, re-rendered from their saved
+specs across a process pool and written into the archive as they finish.
+DOCX files are rendered styled, as the app saves them, unless ``--classic``.
+Only a bounded number of renders are in flight at once, so memory stays flat
+however many documents are exported. ``manifest.json`` at the end of the
+archive lists every file with its SHA-256, plus any document that failed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+
+from wi_images import content_hash
+from wi_pdf import render_pdf
+from wi_render import DEPT_PREFIX_MAP, RenderOptions, WorkInstructionSpec, render_docx, spec_digest
+from wi_repository import WorkInstructionRepository, file_stem, open_repository
+
+MANIFEST_NAME = "manifest.json"
+# Worker processes per export started from the app, where other users' renders share the machine
+APP_WORKERS = int(os.environ.get("WI_EXPORT_WORKERS", 2))
+
+
+def render_saved(repo_root, doc_id, fmt="docx", options=None):
+    """Render one saved document; runs in a worker process. Returns ``(entry, data)``."""
+    # Workers keep their connection between tasks instead of reopening per document
+    repo = open_repository(repo_root)
+    row = repo.get_by_id(doc_id)
+    entry = {"doc_no": row["doc_no"], "rev_no": row["rev_no"], "department": row["department"], "title": row["title"]}
+    try:
+        spec = repo.load_spec(row)
+        data = render_pdf(spec, options) if fmt == "pdf" else render_docx(spec, options)
+    except Exception as exc:
+        entry["error"] = f"{type(exc).__name__}: {exc}"
+        return entry, None
+    entry["spec_sha256"] = spec_digest(spec)
+    return entry, data
+
+
+def export_zip(repo, rows, out, fmt="docx", workers=None, options=None, progress=None, mp_context=None):
+    """Render ``rows`` (from ``repo.select()``) into a ZIP written to ``out`` (path or binary file).
+
+    ``options`` default to styled rendering. ``progress(done, total)`` is
+    called after each document. Pass a "spawn" ``mp_context`` when calling
+    from a multi-threaded process such as the app. Returns the manifest.
+    """
+    # Styled, like the DOCX files the app saves; it also reuses the cached boilerplate clauses
+    options = options or RenderOptions(styled=True)
+    workers = workers or os.cpu_count() or 1
+    manifest = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "format": fmt,
+        "files": [],
+        "failed": [],
+    }
+    names = set()
+    total = len(rows) if hasattr(rows, "__len__") else None
+    rows = iter(rows)
+    done = 0
+    # DOCX and PDF output is already compressed; deflating it again only costs time
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as zf, ProcessPoolExecutor(workers, mp_context) as pool:
+        pending = set()
+
+        def fill():
+            # Keep at most two renders per worker queued or in flight
+            for row in rows:
+                pending.add(pool.submit(render_saved, repo.root, row["id"], fmt, options))
+                if len(pending) >= 2 * workers:
+                    break
+
+        fill()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            pending.difference_update(finished)
+            for future in finished:
+                entry, data = future.result()
+                if data is None:
+                    manifest["failed"].append(entry)
+                else:
+                    name = file_stem(WorkInstructionSpec(doc_no=entry["doc_no"], rev_no=entry["rev_no"])) + "." + fmt
+                    while name in names:
+                        name = "_" + name
+                    names.add(name)
+                    zf.writestr(name, data)
+                    entry.update(file=name, bytes=len(data), sha256=content_hash(data))
+                    manifest["files"].append(entry)
+                done += 1
+                if progress is not None:
+                    progress(done, total)
+            fill()
+        manifest["files"].sort(key=lambda entry: entry["file"])
+        zf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2), compress_type=zipfile.ZIP_DEFLATED)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export saved Work Instructions to a ZIP archive.")
+    selection = parser.add_mutually_exclusive_group(required=True)
+    selection.add_argument("--department", choices=list(DEPT_PREFIX_MAP), help="every WI of a department")
+    selection.add_argument("--prefix", help="every WI whose doc number starts with this prefix, e.g. FUR/L3/")
+    parser.add_argument("--from", dest="seq_from", type=int, help="first doc number in the prefix range")
+    parser.add_argument("--to", dest="seq_to", type=int, help="last doc number in the prefix range")
+    parser.add_argument("--all-revisions", action="store_true", help="export every revision, not just the latest")
+    parser.add_argument("-o", "--output", required=True, help="ZIP file to write")
+    parser.add_argument("-f", "--format", choices=["docx", "pdf"], default="docx", help="output format (default: docx)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--repo", default=None, help="repository directory (default: WI_REPO_DIR or ./wi_repository)")
+    parser.add_argument("--classic", action="store_true",
+                        help="render DOCX files through the classic per-run path instead of named styles")
+    args = parser.parse_args(argv)
+
+    repo = WorkInstructionRepository(args.repo)
+    rows = repo.select(department=args.department, prefix=args.prefix, seq_from=args.seq_from,
+                       seq_to=args.seq_to, all_revisions=args.all_revisions)
+    if not rows:
+        print("No saved Work Instructions match", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    manifest = export_zip(repo, rows, args.output, args.format, args.workers, RenderOptions(styled=not args.classic))
+    elapsed = time.perf_counter() - start
+    for entry in manifest["failed"]:
+        print(f"FAILED {entry['doc_no']} rev {entry['rev_no']}: {entry['error']}", file=sys.stderr)
+    exported = len(manifest["files"])
+    rate = exported / elapsed if elapsed else 0.0
+    print(f"Exported {exported}/{len(rows)} documents to {args.output} in {elapsed:.2f}s ({rate:.1f} docs/s)")
+    return 1 if manifest["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""Process-wide cache of rendered clause fragments.
+
+Boilerplate clauses ("EHS Requirements", "Reference documents", the PPE
+matrix, ...) tend to be identical across many Work Instructions. The styled
+renderer keeps the XML it produced for each clause body here, keyed by a
+hash of the clause kind, content and style version, and splices it into the
+next document that has the same clause instead of rebuilding it.
+
+Pictures cannot be cached as XML because their relationship ids belong to one
+document. A fragment is therefore stored as literal XML segments with the
+picture sources between them, and pictures are embedded afresh on every hit.
+
+The cache is an LRU bounded by the total size of the stored XML
+(``WI_FRAGMENT_CACHE_MB``, default 32; 0 disables it).
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_MB = 32
+# Stands in for a picture run while a fragment is being recorded
+PICTURE_MARK = "\x00picture\x00"
+
+
+class FragmentCache:
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (segments, pictures, size)
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[:2]
+
+    def put(self, key, segments, pictures):
+        size = sum(len(s) for s in segments)
+        with self._lock:
+            if key in self._entries or size > self.max_bytes:
+                return
+            self._entries[key] = (segments, pictures, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = self.misses = self.evictions = 0
+
+
+_cache = FragmentCache(int(float(os.environ.get("WI_FRAGMENT_CACHE_MB", DEFAULT_CACHE_MB)) * 1024 * 1024))
+
+
+def fragment_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def cached_fragment(key, build, picture):
+    """Return the XML ``build(picture)`` yields, from the cache when possible.
+
+    ``build`` must be deterministic for ``key`` and may only embed pictures
+    given as file paths or bytes.
+    """
+    if _cache.max_bytes <= 0:
+        return "".join(build(picture))
+    entry = _cache.get(key)
+    if entry is None:
+        pictures = []
+
+        def record(img, width):
+            pictures.append((img, width))
+            return PICTURE_MARK
+
+        entry = "".join(build(record)).split(PICTURE_MARK), pictures
+        _cache.put(key, *entry)
+    segments, pictures = entry
+    out = [segments[0]]
+    for (img, width), segment in zip(pictures, segments[1:]):
+        out.append(picture(img, width) or "")
+        out.append(segment)
+    return "".join(out)
+
+
+def fragment_cache_stats():
+    return _cache.stats()
+
+
+def clear_fragment_cache():
+    _cache.clear()
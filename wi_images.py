@@ -0,0 +1,93 @@
+"""Preprocessing for pictures embedded in Work Instructions.
+
+Camera photos are downscaled to the size they are printed at, rotated
+according to their EXIF orientation and recompressed before they reach
+python-docx. Results are memoized by content hash so the same upload is only
+processed once per process, however many reruns or steps reuse it.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+DEFAULT_DPI = 200
+JPEG_QUALITY = 85
+CACHE_SIZE = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def read_image_bytes(img):
+    """Return the raw bytes of a path, bytes object or binary file-like."""
+    if isinstance(img, (bytes, bytearray)):
+        return bytes(img)
+    if isinstance(img, str):
+        with open(img, "rb") as f:
+            return f.read()
+    if hasattr(img, "getvalue"):
+        return img.getvalue()
+    img.seek(0)
+    return img.read()
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def normalize_image(img, width_in, dpi=DEFAULT_DPI):
+    """Return ``img`` re-encoded for printing ``width_in`` inches wide at ``dpi``.
+
+    Images with transparency are written as PNG, everything else as JPEG. If
+    re-encoding would not make the picture any smaller the original bytes are
+    returned untouched.
+    """
+    data = read_image_bytes(img)
+    key = (content_hash(data), width_in, dpi)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    result = _normalize(data, round(width_in * dpi))
+
+    with _cache_lock:
+        _cache[key] = result
+        # Normalizing the result again returns it as it is
+        _cache[(content_hash(result), width_in, dpi)] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def _normalize(data, target_width):
+    # Imported here so hashing and reading pictures does not load Pillow
+    from PIL import Image, ImageOps
+
+    with Image.open(BytesIO(data)) as source:
+        # JPEGs are decoded at the smallest scale still twice the target size, either way up,
+        # instead of at camera resolution
+        source.draft(None, (2 * target_width, 2 * target_width))
+        # exif_transpose() returns a copy even when there is nothing to do
+        rotated = source.getexif().get(0x0112, 1) != 1
+        im = ImageOps.exif_transpose(source) if rotated else source
+        resized = im.width > target_width
+        if not rotated and not resized and source.format in ("JPEG", "PNG"):
+            # Already small enough and upright (our own output included); recompressing would only lose quality
+            return data
+        if resized:
+            height = max(1, round(im.height * target_width / im.width))
+            im = im.resize((target_width, height), Image.LANCZOS)
+
+        out = BytesIO()
+        if im.mode in ("RGBA", "LA") or (im.mode == "P" and "transparency" in im.info):
+            im.save(out, "PNG", optimize=True)
+        else:
+            im.convert("RGB").save(out, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    result = out.getvalue()
+    return result if len(result) < len(data) or rotated else data
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,252 @@
+"""Read generated Work Instruction DOCX files back into specs.
+
+    python wi_import.py legacy/ -o specs/ --workers 8 [--repo [--replace]]
+
+``import_docx()`` understands the layout ``create_docx()`` has always
+produced (classic or styled): the header table with DOC. NO / ISSUE /
+REV fields, the title and department paragraphs, numbered "N. Title:"
+clause headings, the Machine/Material/Man resources table, the #/Detail/
+Picture procedure table and the PPE icon table. Step pictures come back as
+the embedded image bytes and PPE icons are mapped back to ``PPE_OPTIONS``
+names, whether the document embeds the full-size icon files or the
+print-size icons from ``wi_ppe``.
+
+The batch mode writes ``<name>.json`` plus a ``<name>_images/`` directory
+per document, ready for ``wi_batch.py``; with ``--repo`` the specs are also
+recorded in the WI repository so they can be regenerated and exported.
+A document whose number and revision are already saved for a different
+title or department is reported as failed unless ``--replace`` is given.
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+
+from docx import Document
+from docx.image.image import Image as DocxImage
+from docx.oxml.ns import qn
+
+from wi_images import content_hash
+from wi_ppe import PPE_OPTIONS, ppe_by_hash
+from wi_render import WorkInstructionSpec, clause_kind, spec_digest
+from wi_repository import open_repository
+
+_HEADING_RE = re.compile(r"^(\d+)\.\s+(.*):$")
+_HEADER_FIELDS = {
+    "DOC. NO:": "doc_no",
+    "ISSUE NO. / DATE:": "issue",
+    "REV. NO:": "rev_no",
+    "REV. DATE:": "rev_date",
+}
+
+
+class NotAWorkInstruction(ValueError):
+    """Raised when a DOCX does not have the generated Work Instruction layout."""
+
+
+_ppe_by_hash = None  # icon content hash -> PPE name, built on first use
+
+
+def _ppe_hashes():
+    global _ppe_by_hash
+    if _ppe_by_hash is None:
+        _ppe_by_hash = ppe_by_hash()
+    return _ppe_by_hash
+
+
+def _text(el):
+    """Text of a paragraph or cell, with breaks and tabs restored and paragraphs joined by newlines."""
+    paragraphs = el.iter(qn("w:p")) if el.tag != qn("w:p") else [el]
+    lines = []
+    for p in paragraphs:
+        parts = []
+        for node in p.iter(qn("w:t"), qn("w:br"), qn("w:tab")):
+            if node.tag == qn("w:t"):
+                parts.append(node.text or "")
+            elif node.tag == qn("w:br"):
+                parts.append("\n")
+            else:
+                parts.append("\t")
+        lines.append("".join(parts))
+    return "\n".join(lines)
+
+
+def _rows(tbl):
+    return [tr.findall(qn("w:tc")) for tr in tbl.findall(qn("w:tr"))]
+
+
+def _images(part, el):
+    return [part.related_parts[blip.get(qn("r:embed"))].blob for blip in el.iter(qn("a:blip"))]
+
+
+def _header_fields(doc):
+    fields = {}
+    for table in doc.sections[0].header.tables:
+        for row in _rows(table._tbl):
+            for cell in row:
+                text = _text(cell).strip()
+                for label, name in _HEADER_FIELDS.items():
+                    if text.startswith(label):
+                        fields[name] = text[len(label):].strip()
+    return fields
+
+
+def _footer_names(doc):
+    for table in doc.sections[0].footer.tables:
+        rows = _rows(table._tbl)
+        if len(rows) >= 2 and [_text(c).strip() for c in rows[0][:3]] == ["Prepared By", "Reviewed By", "Approved By"]:
+            return [_text(c).strip() for c in rows[1][:3]]
+    return ["", "", ""]
+
+
+def _procedure_steps(part, tbl):
+    steps = []
+    for cells in _rows(tbl)[1:]:
+        images = _images(part, cells[2]) if len(cells) > 2 else []
+        # The form has two picture slots per step
+        images = (images + [None, None])[:max(2, len(images))]
+        steps.append({"detail": _text(cells[1]) if len(cells) > 1 else "", "images": images})
+    return steps
+
+
+def _ppe_names(part, tbl):
+    known = {ppe["name"] for ppe in PPE_OPTIONS}
+    rows = _rows(tbl)
+    icons, labels = (rows + [[], []])[:2]
+    names = []
+    for col, label_cell in enumerate(labels):
+        name = _text(label_cell).strip()
+        if name not in known and col < len(icons):
+            # Unknown label: recognise the icon itself
+            name = next((_ppe_hashes().get(content_hash(blob)) for blob in _images(part, icons[col])), None)
+        if name in known:
+            names.append(name)
+    return names
+
+
+def import_docx(source):
+    """Parse a generated Work Instruction (path, bytes or binary file) into a ``WorkInstructionSpec``.
+
+    Step pictures are returned as ``bytes``. The PPEs matrix clause text is not
+    part of the rendered document and comes back empty.
+    """
+    doc = Document(BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+    part = doc.part
+    body = [el for el in doc.element.body.iterchildren() if el.tag != qn("w:sectPr")]
+    if len(body) < 2 or body[0].tag != qn("w:p") or not _text(body[1]).startswith("Department:"):
+        raise NotAWorkInstruction("missing title and department paragraphs")
+
+    spec = WorkInstructionSpec(title=_text(body[0]), department=_text(body[1])[len("Department:"):].strip())
+    fields = _header_fields(doc)
+    spec.doc_no = fields.get("doc_no", "")
+    spec.rev_no = fields.get("rev_no", "00")
+    spec.rev_date = fields.get("rev_date", "")
+    spec.issue_date = fields.get("issue", "").rpartition("/")[2].strip()
+    spec.prep_by, spec.review_by, spec.approve_by = _footer_names(doc)
+
+    rest = body[2:]
+    for i in range(0, len(rest) - 1, 2):
+        heading, block = rest[i], rest[i + 1]
+        match = _HEADING_RE.match(_text(heading).strip()) if heading.tag == qn("w:p") else None
+        if match is None:
+            raise NotAWorkInstruction(f"expected a numbered clause heading, found {_text(heading)[:40]!r}")
+        title = match.group(2)
+        kind = clause_kind(title)
+        if kind == "resources" and block.tag == qn("w:tbl"):
+            entries = [_text(cell) for cell in (_rows(block) + [[], []])[1]]
+            content = dict(zip(["machine", "material", "man"], entries + ["", "", ""]))
+        elif kind == "procedure" and block.tag == qn("w:tbl"):
+            content = _procedure_steps(part, block)
+        elif kind == "ppe":
+            content = ""
+            spec.ppe_selected = _ppe_names(part, block) if block.tag == qn("w:tbl") else []
+        else:
+            content = _text(block)
+        spec.clauses.append((title, content))
+    return spec
+
+
+def write_spec(spec, out_dir, name):
+    """Write ``spec`` as ``<name>.json`` with its step pictures under ``<name>_images/``."""
+    image_dir = os.path.join(out_dir, name + "_images")
+    counter = itertools.count(1)
+
+    def image_ref(img):
+        filename = f"picture{next(counter)}.{DocxImage.from_blob(img).ext}"
+        os.makedirs(image_dir, exist_ok=True)
+        with open(os.path.join(image_dir, filename), "wb") as f:
+            f.write(img)
+        return f"{name}_images/{filename}"
+
+    path = os.path.join(out_dir, name + ".json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(spec.to_dict(image_ref), f, indent=2, ensure_ascii=False)
+    return path
+
+
+def import_file(docx_path, out_dir, repo_root=None, replace=False):
+    # Runs in a worker process; errors are returned as text like wi_batch.render_spec_file
+    try:
+        with open(docx_path, "rb") as f:
+            data = f.read()
+        spec = import_docx(data)
+        name = os.path.splitext(os.path.basename(docx_path))[0]
+        out_path = write_spec(spec, out_dir, name)
+        if repo_root is not None:
+            open_repository(repo_root).save(spec, spec_digest(spec), docx=data, replace=replace)
+        return docx_path, out_path, None
+    except Exception as exc:
+        return docx_path, None, f"{type(exc).__name__}: {exc}"
+
+
+def run_import(docx_paths, out_dir, workers=None, repo_root=None, replace=False):
+    """Import ``docx_paths`` across a process pool; returns ``(results, elapsed)`` like ``wi_batch.run_batch``."""
+    os.makedirs(out_dir, exist_ok=True)
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(import_file, path, out_dir, repo_root, replace) for path in docx_paths]
+        for future in as_completed(futures):
+            results.append(future.result())
+    return results, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import generated Work Instruction DOCX files back into specs.")
+    parser.add_argument("docx_dir", help="directory containing .docx files")
+    parser.add_argument("-o", "--out-dir", default="specs", help="output directory for JSON specs (default: specs)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--repo", nargs="?", const="", default=None,
+                        help="also save the specs in the WI repository (optionally at this directory)")
+    parser.add_argument("--replace", action="store_true",
+                        help="with --repo, replace saved documents that have the same number and revision")
+    args = parser.parse_args(argv)
+
+    docx_paths = sorted(
+        os.path.join(args.docx_dir, name) for name in os.listdir(args.docx_dir)
+        if name.lower().endswith(".docx") and not name.startswith("~$")
+    )
+    if not docx_paths:
+        print(f"No DOCX files found in {args.docx_dir}", file=sys.stderr)
+        return 1
+
+    repo_root = None
+    if args.repo is not None:
+        repo_root = open_repository(args.repo or None).root
+    results, elapsed = run_import(docx_paths, args.out_dir, args.workers, repo_root, args.replace)
+    failures = [(path, error) for path, _, error in results if error]
+    for path, error in failures:
+        print(f"FAILED {path}: {error}", file=sys.stderr)
+    imported = len(results) - len(failures)
+    rate = imported / elapsed if elapsed else 0.0
+    print(f"Imported {imported}/{len(results)} documents in {elapsed:.2f}s ({rate:.1f} docs/s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Bounded background queue for renders in a shared deployment.
+
+Sessions submit render jobs instead of rendering in their own script thread.
+A fixed number of worker threads (``WI_RENDER_WORKERS``) run the jobs, and at
+most ``WI_RENDER_QUEUE`` jobs may wait at once; beyond that ``submit()``
+raises ``QueueFull`` so the caller can ask the user to retry. Waiting jobs are
+kept per owner and handed out round-robin, so a user who queues many large
+documents cannot starve everyone else.
+
+Jobs report progress through ``start_stage()`` / ``advance()``, which the UI
+polls to show messages such as "Embedding image 7/40".
+"""
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_QUEUE_DEPTH = 16
+
+_job_ids = itertools.count(1)
+
+
+class QueueFull(Exception):
+    """Raised by ``RenderQueue.submit()`` when the queue is at its depth limit."""
+
+
+class RenderJob:
+    """One queued render. ``fn(job)`` runs on a worker thread and its return value becomes ``result``."""
+
+    def __init__(self, owner, fn):
+        self.id = next(_job_ids)
+        self.owner = owner
+        self.fn = fn
+        self.state = "queued"  # queued, running, done, failed, cancelled
+        self.label = "Waiting for a free renderer"
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = None
+        self.submitted_at = time.monotonic()
+        self.finished = threading.Event()
+
+    def start_stage(self, label, total=0):
+        self.label = label
+        self.done = 0
+        self.total = total
+
+    def advance(self):
+        self.done += 1
+
+    @property
+    def message(self):
+        if self.total:
+            return f"{self.label} {min(self.done, self.total)}/{self.total}"
+        return self.label
+
+    @property
+    def fraction(self):
+        if self.state in ("done", "failed"):
+            return 1.0
+        return min(self.done / self.total, 1.0) if self.total else 0.0
+
+
+class RenderQueue:
+    """A fixed pool of render threads fed from per-owner FIFO queues."""
+
+    def __init__(self, workers=None, max_queued=None):
+        self.workers = workers or int(os.environ.get("WI_RENDER_WORKERS", DEFAULT_WORKERS))
+        self.max_queued = max_queued or int(os.environ.get("WI_RENDER_QUEUE", DEFAULT_QUEUE_DEPTH))
+        self._cond = threading.Condition()
+        # owner -> deque of waiting jobs; the front owner is served next
+        self._pending = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        for n in range(self.workers):
+            threading.Thread(target=self._work, name=f"wi-render-{n}", daemon=True).start()
+
+    def submit(self, owner, fn):
+        with self._cond:
+            if self._queued >= self.max_queued:
+                raise QueueFull(f"{self._queued} renders are already waiting")
+            job = RenderJob(owner, fn)
+            self._pending.setdefault(owner, deque()).append(job)
+            self._queued += 1
+            self._cond.notify()
+        return job
+
+    def cancel(self, job):
+        """Drop ``job`` if it has not started yet. Returns whether it was cancelled."""
+        with self._cond:
+            jobs = self._pending.get(job.owner)
+            if job.state != "queued" or jobs is None or job not in jobs:
+                return False
+            jobs.remove(job)
+            if not jobs:
+                del self._pending[job.owner]
+            self._queued -= 1
+            job.state = "cancelled"
+        job.finished.set()
+        return True
+
+    def waiting_ahead(self, job):
+        """Roughly how many jobs will start before ``job``, given round-robin order."""
+        with self._cond:
+            jobs = self._pending.get(job.owner)
+            if job.state != "queued" or jobs is None or job not in jobs:
+                return 0
+            rounds = jobs.index(job) + 1
+            owners = list(self._pending)
+            ahead = sum(min(len(self._pending[o]), rounds) for o in owners[:owners.index(job.owner)])
+            ahead += sum(min(len(self._pending[o]), rounds - 1) for o in owners[owners.index(job.owner) + 1:])
+            return ahead + rounds - 1
+
+    def stats(self):
+        with self._cond:
+            return {"workers": self.workers, "running": self._running, "queued": self._queued,
+                    "max_queued": self.max_queued}
+
+    def _next_job(self):
+        owner, jobs = next(iter(self._pending.items()))
+        job = jobs.popleft()
+        if jobs:
+            self._pending.move_to_end(owner)
+        else:
+            del self._pending[owner]
+        self._queued -= 1
+        return job
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job = self._next_job()
+                job.state = "running"
+                self._running += 1
+            job.start_stage("Starting")
+            try:
+                job.result = job.fn(job)
+                job.state = "done"
+            except Exception as exc:
+                job.error = f"{type(exc).__name__}: {exc}"
+                job.state = "failed"
+            finally:
+                # The closure holds the spec and its uploaded pictures; the result is all that is needed now
+                job.fn = None
+                with self._cond:
+                    self._running -= 1
+                job.finished.set()
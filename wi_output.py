@@ -0,0 +1,19 @@
+"""Scratch files for rendered documents.
+
+A rendered DOCX or PDF is written to a ``SpooledTemporaryFile``: it stays in
+memory while it is small and moves to a temporary file on disk once it passes
+``WI_SPOOL_MB`` (default 4). The repository then copies it into its object
+store in chunks, so a large document is never held in memory whole.
+"""
+import os
+import tempfile
+
+DEFAULT_SPOOL_MB = 4
+CHUNK_SIZE = 1024 * 1024
+
+SPOOL_BYTES = int(float(os.environ.get("WI_SPOOL_MB", DEFAULT_SPOOL_MB)) * 1024 * 1024)
+
+
+def spooled_output():
+    """A binary file for one rendered document; use it as a context manager."""
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES, prefix="wi_out_")
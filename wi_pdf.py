@@ -0,0 +1,417 @@
+"""Direct PDF rendering of Work Instructions with fpdf.
+
+Lays out the same header table, numbered clauses, Resources table, procedure
+table, PPE matrix and approval footer as the DOCX, without a Word or
+LibreOffice round trip. It takes the same ``WorkInstructionSpec``.
+
+fpdf only embeds pictures from files and has no alpha channel support, so
+pictures are normalized, flattened onto white and written as JPEGs to a
+scratch directory for the duration of the render.
+"""
+import os
+import tempfile
+from io import BytesIO
+
+from fpdf import FPDF
+from PIL import Image
+
+from wi_images import content_hash, normalize_image, read_image_bytes
+from wi_output import CHUNK_SIZE
+from wi_ppe import ppe_icon, selected_ppe
+from wi_render import RenderOptions
+from wi_spec import PPE_CLAUSE, STEP_PICTURE_WIDTH_IN
+from wi_template import COMPANY_NAME, LOGO_PATH
+
+MM_PER_INCH = 25.4
+TWIP = MM_PER_INCH / 1440
+
+# Page geometry matches the DOCX section: Letter paper, 0.59in/0.65in margins,
+# header and footer 0.5in from the page edge
+PAGE_FORMAT = (8.5 * MM_PER_INCH, 11 * MM_PER_INCH)
+LEFT_MARGIN = 0.65 * MM_PER_INCH
+RIGHT_MARGIN = 0.59 * MM_PER_INCH
+EDGE_DISTANCE = 0.5 * MM_PER_INCH
+
+HEADER_WIDTHS = [1.5 * MM_PER_INCH, 3.59 * MM_PER_INCH, 2.2 * MM_PER_INCH]
+HEADER_ROW_HEIGHT = 300 * TWIP
+FOOTER_WIDTHS = [2.0 * MM_PER_INCH, 2.0 * MM_PER_INCH, 2.0 * MM_PER_INCH, 1.3 * MM_PER_INCH]
+FOOTER_LABEL_HEIGHT = 6
+FOOTER_ROW_HEIGHT = 500 * TWIP
+FOOTER_HEIGHT = FOOTER_LABEL_HEIGHT + 2 * FOOTER_ROW_HEIGHT
+PROCEDURE_WIDTHS = [10, 95, 80.5]
+
+HEADER_FILL = (0xB7, 0xDE, 0xE8)
+TITLE_COLOR = (0x36, 0x5F, 0x91)
+FONT = "Arial"
+BODY_SIZE = 11
+LINE_HEIGHT = 5.5
+CELL_PADDING = 1.5
+
+# The PDF core fonts are Latin-1; map the common typographic characters first
+_TEXT_REPLACEMENTS = {
+    "–": "-", "—": "-", "‘": "'", "’": "'",
+    "“": '"', "”": '"', "•": "*", "…": "...", "\t": "    ",
+}
+
+
+def _text(value):
+    text = str(value or "")
+    for char, replacement in _TEXT_REPLACEMENTS.items():
+        text = text.replace(char, replacement)
+    return text.encode("latin-1", "replace").decode("latin-1")
+
+
+class WorkInstructionPDF(FPDF):
+
+    def __init__(self, spec, options, image_dir):
+        super().__init__(unit="mm", format=PAGE_FORMAT)
+        self.spec = spec
+        self.options = options
+        self.image_dir = image_dir
+        self.body_top = EDGE_DISTANCE + 4 * HEADER_ROW_HEIGHT + 4
+        self.set_margins(LEFT_MARGIN, self.body_top, RIGHT_MARGIN)
+        self.set_auto_page_break(True, EDGE_DISTANCE + FOOTER_HEIGHT + 4)
+        self.alias_nb_pages()
+
+    # -- pictures ---------------------------------------------------------
+
+    def picture_file(self, img, width_in):
+        """Write ``img`` as a flattened JPEG and return ``(path, aspect ratio)``."""
+        data = read_image_bytes(img)
+        if self.options.image_dpi:
+            data = normalize_image(data, width_in, self.options.image_dpi)
+        path = os.path.join(self.image_dir, content_hash(data) + ".jpg")
+        with Image.open(BytesIO(data)) as im:
+            aspect = im.height / im.width
+            if not os.path.exists(path):
+                im = im.convert("RGBA")
+                flat = Image.new("RGB", im.size, (255, 255, 255))
+                flat.paste(im, mask=im.getchannel("A"))
+                flat.save(path, "JPEG", quality=90)
+        return path, aspect
+
+    # -- text helpers -----------------------------------------------------
+
+    def wrap(self, text, width):
+        """Split ``text`` into lines that fit ``width`` with the current font."""
+        width -= 2 * self.c_margin
+        lines = []
+        for paragraph in _text(text).replace("\r\n", "\n").split("\n"):
+            line = ""
+            for word in paragraph.split(" "):
+                candidate = f"{line} {word}" if line else word
+                if self.get_string_width(candidate) <= width or not line:
+                    line = candidate
+                else:
+                    lines.append(line)
+                    line = word
+            lines.append(line)
+        return lines
+
+    def text_block(self, x, y, width, lines, align="L", line_height=LINE_HEIGHT):
+        # The caller has laid the lines out; one near the page bottom must not break the page on its own
+        auto_page_break = self.auto_page_break
+        self.set_auto_page_break(False, self.b_margin)
+        try:
+            for i, line in enumerate(lines):
+                self.set_xy(x, y + i * line_height)
+                self.cell(width, line_height, line, 0, 0, align)
+        finally:
+            self.set_auto_page_break(auto_page_break, self.b_margin)
+
+    def paragraph(self, text, style="", size=BODY_SIZE, space_after=2):
+        self.set_font(FONT, style, size)
+        self.multi_cell(0, LINE_HEIGHT, _text(text))
+        self.ln(space_after)
+
+    # -- page furniture ---------------------------------------------------
+
+    def header(self):
+        x0, y0 = LEFT_MARGIN, EDGE_DISTANCE
+        w0, w1, w2 = HEADER_WIDTHS
+        h = HEADER_ROW_HEIGHT
+        self.set_draw_color(0)
+        self.rect(x0, y0, w0, 4 * h)
+        self.rect(x0 + w0, y0, w1, 2 * h)
+        self.rect(x0 + w0, y0 + 2 * h, w1, 2 * h)
+        for row in range(4):
+            self.rect(x0 + w0 + w1, y0 + row * h, w2, h)
+
+        if os.path.exists(LOGO_PATH):
+            path, aspect = self.picture_file(LOGO_PATH, 1.2)
+            logo_w = 1.2 * MM_PER_INCH
+            logo_h = min(logo_w * aspect, 4 * h - 1)
+            logo_w = logo_h / aspect
+            self.image(path, x0 + (w0 - logo_w) / 2, y0 + (4 * h - logo_h) / 2, logo_w, logo_h)
+
+        self.set_font(FONT, "B", 14)
+        self.set_xy(x0 + w0, y0)
+        self.cell(w1, 2 * h, _text(COMPANY_NAME), 0, 0, "C")
+        # Word wraps long titles inside the merged cell; shrink until two lines fit
+        title = f"WORK INSTRUCTION – {self.spec.title.upper()}"
+        size = 12
+        while True:
+            self.set_font(FONT, "B", size)
+            line_h = size * MM_PER_INCH / 72 * 1.1
+            lines = self.wrap(title, w1)
+            if len(lines) * line_h <= 2 * h or size <= 6:
+                break
+            size -= 1
+        self.text_block(x0 + w0, y0 + 2 * h + (2 * h - len(lines) * line_h) / 2, w1, lines, "C", line_h)
+
+        self.set_font(FONT, "", 9)
+        spec = self.spec
+        for row, text in enumerate([
+            f"DOC. NO: {spec.doc_no}",
+            f"ISSUE NO. / DATE: {spec.rev_no} / {spec.issue_date}",
+            f"REV. NO: {spec.rev_no}",
+            f"REV. DATE: {spec.rev_date}"
+        ]):
+            self.set_xy(x0 + w0 + w1, y0 + row * h)
+            self.cell(w2, h, _text(text), 0, 0, "L")
+        self.set_xy(LEFT_MARGIN, self.body_top)
+
+    def footer(self):
+        x0 = LEFT_MARGIN
+        y0 = self.h - EDGE_DISTANCE - FOOTER_HEIGHT
+        heights = [FOOTER_LABEL_HEIGHT, FOOTER_ROW_HEIGHT, FOOTER_ROW_HEIGHT]
+        spec = self.spec
+        rows = [["Prepared By", "Reviewed By", "Approved By"], [spec.prep_by, spec.review_by, spec.approve_by], ["", "", ""]]
+        self.set_font(FONT, "", 10)
+        y = y0
+        for height, row in zip(heights, rows):
+            x = x0
+            for width, text in zip(FOOTER_WIDTHS, row):
+                self.set_xy(x, y)
+                self.cell(width, height, _text(text), 1, 0, "C")
+                x += width
+            y += height
+        sig_x = x0 + sum(FOOTER_WIDTHS[:3])
+        self.rect(sig_x, y0, FOOTER_WIDTHS[3], FOOTER_HEIGHT)
+        self.set_xy(sig_x, y0)
+        self.cell(FOOTER_WIDTHS[3], FOOTER_LABEL_HEIGHT, "Signature", 0, 0, "C")
+        self.set_xy(sig_x, y0 + FOOTER_HEIGHT - FOOTER_ROW_HEIGHT)
+        self.cell(FOOTER_WIDTHS[3], FOOTER_ROW_HEIGHT, f"Page {self.page_no()} of {{nb}}", 0, 0, "C")
+
+    # -- tables -----------------------------------------------------------
+
+    def ensure_space(self, height):
+        if self.get_y() + height > self.page_break_trigger:
+            self.add_page()
+            return True
+        return False
+
+    def table_row(self, widths, cells, height, fill=False, valign="middle"):
+        """Draw one bordered row. ``cells`` are ``(lines, align, style)`` or callables drawing at (x, y, w, h)."""
+        x, y = LEFT_MARGIN, self.get_y()
+        if fill:
+            self.set_fill_color(*HEADER_FILL)
+        for width, cell in zip(widths, cells):
+            self.rect(x, y, width, height, "DF" if fill else "D")
+            if callable(cell):
+                cell(x, y, width, height)
+            else:
+                lines, align, style = cell
+                self.set_font(FONT, style, BODY_SIZE)
+                text_h = len(lines) * LINE_HEIGHT
+                top = y + (height - text_h) / 2 if valign == "middle" else y + CELL_PADDING
+                self.text_block(x, top, width, lines, align)
+            x += width
+        self.set_xy(LEFT_MARGIN, y + height)
+
+    def text_items(self, lines, align="L"):
+        """``lines`` as ``split_row()`` items."""
+        def item(line):
+            def draw(x, y, w):
+                self.set_font(FONT, "", BODY_SIZE)
+                self.text_block(x, y, w, [line], align)
+            return LINE_HEIGHT, draw
+        return [item(line) for line in lines]
+
+    def split_row(self, widths, columns, padding, header):
+        """Draw a row too tall for one page, continuing it on as many pages as it needs.
+
+        ``columns`` are lists of ``(height, draw)`` items stacked from the top
+        of each cell; ``draw(x, y, w)`` draws one item. Each page gets the
+        items that fit, and ``header()`` redraws the table header on the next.
+        """
+        columns = [list(items) for items in columns]
+        new_page = False
+        while True:
+            y = self.get_y()
+            room = self.page_break_trigger - y - 2 * padding
+            chunks = []
+            for items in columns:
+                chunk, used = [], 0
+                while items and used + items[0][0] <= room + 1e-6:
+                    used += items[0][0]
+                    chunk.append(items.pop(0))
+                chunks.append(chunk)
+            if not any(chunks):
+                if not new_page:
+                    self.add_page()
+                    header()
+                    new_page = True
+                    continue
+                # Taller than a whole page: drawn anyway, as an unsplit row would be
+                i = next(i for i, items in enumerate(columns) if items)
+                chunks[i].append(columns[i].pop(0))
+            done = not any(columns)
+            height = max(sum(item_h for item_h, _ in chunk) for chunk in chunks) + 2 * padding
+            if not done:
+                # The row runs to the bottom of the page and continues on the next
+                height = max(height, self.page_break_trigger - y)
+            x = LEFT_MARGIN
+            for width, chunk in zip(widths, chunks):
+                self.rect(x, y, width, height)
+                top = y + padding
+                for item_h, draw in chunk:
+                    draw(x, top, width)
+                    top += item_h
+                x += width
+            self.set_xy(LEFT_MARGIN, y + height)
+            if done:
+                return
+            self.add_page()
+            header()
+            new_page = True
+
+    def resources_table(self, content):
+        width = self.w - LEFT_MARGIN - RIGHT_MARGIN
+        widths = [width / 3] * 3
+        self.set_font(FONT, "B", BODY_SIZE)
+        header = [(self.wrap(h, w), "C", "B") for h, w in zip(["Machine", "Material", "Man"], widths)]
+        header_h = LINE_HEIGHT + 2 * 1.06
+        self.ensure_space(header_h)
+        self.table_row(widths, header, header_h, fill=True)
+        self.set_font(FONT, "", BODY_SIZE)
+        entries = [content["machine"], content["material"], content["man"]]
+        cells = [(self.wrap(entry, w), "C", "") for entry, w in zip(entries, widths)]
+        height = max(len(lines) for lines, _, _ in cells) * LINE_HEIGHT + 2 * 2.12
+        if height > self.page_break_trigger - self.body_top - header_h:
+            columns = [self.text_items(lines, "C") for lines, _, _ in cells]
+            self.split_row(widths, columns, 2.12, lambda: self.table_row(widths, header, header_h, fill=True))
+        else:
+            self.ensure_space(height)
+            self.table_row(widths, cells, height)
+        self.ln(3)
+
+    def picture_item(self, path, width, aspect):
+        def draw(x, y, w):
+            self.image(path, x + (w - width) / 2, y, width, width * aspect)
+        return draw
+
+    def procedure_header(self):
+        cells = [([h], "C", "B") for h in ["#", "Detail", "Picture"]]
+        self.table_row(PROCEDURE_WIDTHS, cells, LINE_HEIGHT, fill=True)
+
+    def procedure_table(self, steps):
+        picture_w = STEP_PICTURE_WIDTH_IN * MM_PER_INCH
+        self.ensure_space(2 * LINE_HEIGHT)
+        self.procedure_header()
+        for step_idx, step in enumerate(steps):
+            pictures = []
+            for img in step["images"]:
+                if img is not None:
+                    try:
+                        pictures.append(self.picture_file(img, STEP_PICTURE_WIDTH_IN))
+                    except Exception:
+                        pass
+                    if self.options.progress is not None:
+                        self.options.progress()
+            self.set_font(FONT, "", BODY_SIZE)
+            lines = self.wrap(step["detail"], PROCEDURE_WIDTHS[1])
+            pictures_h = LINE_HEIGHT + sum(picture_w * aspect + CELL_PADDING for _, aspect in pictures)
+            height = max(len(lines) * LINE_HEIGHT, pictures_h) + CELL_PADDING
+
+            def draw_pictures(x, y, w, h, pictures=pictures):
+                # The DOCX cell starts with an empty paragraph before the pictures
+                top = y + LINE_HEIGHT
+                for path, aspect in pictures:
+                    self.image(path, x + (w - picture_w) / 2, top, picture_w, picture_w * aspect)
+                    top += picture_w * aspect + CELL_PADDING
+
+            body_h = self.page_break_trigger - self.body_top - LINE_HEIGHT
+            if height > body_h:
+                # A picture taller than a page is scaled down to fit one
+                max_h = body_h - LINE_HEIGHT - 2 * CELL_PADDING
+                self.split_row(PROCEDURE_WIDTHS, [
+                    self.text_items([str(step_idx+1)], "C"),
+                    self.text_items(lines),
+                    [(LINE_HEIGHT - CELL_PADDING, lambda x, y, w: None)] + [
+                        (min(picture_w * aspect, max_h) + CELL_PADDING,
+                         self.picture_item(path, min(picture_w, max_h / aspect), aspect))
+                        for path, aspect in pictures
+                    ],
+                ], CELL_PADDING, self.procedure_header)
+                continue
+            if self.ensure_space(height):
+                self.procedure_header()
+            self.table_row(
+                PROCEDURE_WIDTHS,
+                [([str(step_idx+1)], "C", ""), (lines, "L", ""), draw_pictures],
+                height,
+                valign="top",
+            )
+        self.ln(3)
+
+    def ppe_table(self, selected):
+        width = 7.09 * MM_PER_INCH / len(selected)
+        icon_w = min(1.0 * MM_PER_INCH, width - 2)
+        icons = [self.picture_file(ppe_icon(ppe["name"]), 1.0) for ppe in selected]
+        icon_row_h = max((icon_w * icon[1] for icon in icons if icon), default=LINE_HEIGHT) + 2 * CELL_PADDING
+
+        def icon_cell(icon):
+            def draw(x, y, w, h):
+                if icon:
+                    path, aspect = icon
+                    self.image(path, x + (w - icon_w) / 2, y + (h - icon_w * aspect) / 2, icon_w, icon_w * aspect)
+            return draw
+
+        self.ensure_space(icon_row_h + LINE_HEIGHT)
+        self.table_row([width] * len(selected), [icon_cell(icon) for icon in icons], icon_row_h)
+        self.table_row([width] * len(selected), [([_text(ppe["name"])], "C", "") for ppe in selected], LINE_HEIGHT)
+        self.ln(3)
+
+    # -- document ---------------------------------------------------------
+
+    def build(self):
+        spec = self.spec
+        self.add_page()
+        self.set_text_color(*TITLE_COLOR)
+        self.paragraph(spec.title, "B", 14, space_after=3)
+        self.set_text_color(0)
+        self.paragraph(f"Department: {spec.department}")
+
+        for idx, (title, content) in enumerate(spec.clauses, 1):
+            self.set_font(FONT, "B", BODY_SIZE)
+            self.ensure_space(2 * LINE_HEIGHT)
+            self.paragraph(f"{idx}. {title}:", "B", space_after=0)
+            if title == "Resources required":
+                self.resources_table(content)
+            elif title == "Procedure steps":
+                self.procedure_table(content)
+            elif title == PPE_CLAUSE:
+                selected_ppe_objs = selected_ppe(spec.ppe_selected)
+                if selected_ppe_objs:
+                    self.ppe_table(selected_ppe_objs)
+                else:
+                    self.paragraph("No PPEs selected.")
+            else:
+                self.paragraph(content)
+
+
+def render_pdf(spec, options=None, out=None):
+    """Render a spec and return the PDF file as bytes, or write it to the binary file ``out``."""
+    options = options or RenderOptions()
+    with tempfile.TemporaryDirectory(prefix="wi_pdf_") as image_dir:
+        pdf = WorkInstructionPDF(spec, options, image_dir)
+        pdf.build()
+        data = pdf.output(dest="S")
+    # fpdf 1.7 returns a latin-1 str, fpdf2 returns a bytearray
+    if out is None:
+        return data.encode("latin-1") if isinstance(data, str) else bytes(data)
+    # Encoded a chunk at a time so the PDF is not held twice
+    for start in range(0, len(data), CHUNK_SIZE):
+        chunk = data[start:start + CHUNK_SIZE]
+        out.write(chunk.encode("latin-1") if isinstance(chunk, str) else chunk)
@@ -0,0 +1,83 @@
+"""Registry of the PPE icons bundled with the app.
+
+The icons are the PNGs next to this file listed in ``ICON_NAMES``; other
+images in the app directory are not PPE. The first time an icon is needed
+all of them are loaded, downsized to the 1 inch they are printed at
+and kept in memory as palette PNGs, so renders embed icons without touching
+the disk or resampling the full-size artwork again.
+"""
+import os
+import threading
+from io import BytesIO
+
+from wi_images import DEFAULT_DPI, content_hash
+from wi_spec import BASE_DIR
+
+ICON_WIDTH_IN = 1.0
+
+# File stem -> display name, in the order the PPE table lists them. Add an entry here for a new icon.
+ICON_NAMES = {
+    "goggle": "Goggle",
+    "shoe": "Shoe",
+    "helmet": "Helmet",
+    "gloves": "Gloves",
+    "mask": "Mask",
+    "apron": "Apron",
+    "earplug": "Ear Plug",
+    "face-shield": "Face Shield",
+    "harness": "Safety Harness",
+    "mask1": "Respirator",
+}
+
+_icons = None  # name -> PNG bytes at print size
+_lock = threading.Lock()
+
+
+def _discover():
+    paths = {stem: os.path.join(BASE_DIR, stem + ".png") for stem in ICON_NAMES}
+    return [{"name": name, "image": paths[stem]} for stem, name in ICON_NAMES.items() if os.path.exists(paths[stem])]
+
+
+PPE_OPTIONS = _discover()
+
+
+def _load_icon(path, width):
+    from PIL import Image  # only needed once the icons are loaded
+
+    with Image.open(path) as im:
+        im = im.convert("RGBA")
+        if im.width > width:
+            im = im.resize((width, max(1, round(im.height * width / im.width))), Image.LANCZOS)
+        # Flat artwork: a palette keeps the edges and is a fraction of the size of RGBA
+        out = BytesIO()
+        im.quantize(256, method=Image.Quantize.FASTOCTREE).save(out, "PNG", optimize=True)
+    return out.getvalue()
+
+
+def load_icons():
+    """Load every icon at print size; returns name -> PNG bytes. Only the first call does any work."""
+    global _icons
+    with _lock:
+        if _icons is None:
+            width = round(ICON_WIDTH_IN * DEFAULT_DPI)
+            _icons = {ppe["name"]: _load_icon(ppe["image"], width) for ppe in PPE_OPTIONS}
+        return _icons
+
+
+def ppe_icon(name):
+    """PNG bytes of the icon for PPE ``name`` at print size; None if there is no such PPE."""
+    return load_icons().get(name)
+
+
+def selected_ppe(names):
+    """The ``PPE_OPTIONS`` entries in ``names``, in registry order."""
+    return [ppe for ppe in PPE_OPTIONS if ppe["name"] in names]
+
+
+def ppe_by_hash():
+    """Content hash -> PPE name, for both the bundled files and the icons embedded in documents."""
+    by_hash = {content_hash(icon): name for name, icon in load_icons().items()}
+    for ppe in PPE_OPTIONS:
+        with open(ppe["image"], "rb") as f:
+            by_hash[content_hash(f.read())] = ppe["name"]
+    return by_hash
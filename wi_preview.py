@@ -0,0 +1,232 @@
+"""Low-resolution PNG previews of Work Instruction pages.
+
+The preview runs the PDF renderer's layout without producing a PDF: every
+box, line of text and picture ``WorkInstructionPDF`` places is recorded per
+page and drawn with Pillow at a low resolution. Pages break where they do in
+the PDF, and no Word, LibreOffice or PDF rasterizer is involved.
+
+Pictures are decoded once, at thumbnail size. Drawn pages are cached by a
+hash of what is on them, so after an edit only the pages that changed are
+drawn again, and whole previews are cached by spec digest
+(``WI_PREVIEW_CACHE_MB``, default 16).
+"""
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+from wi_images import content_hash, read_image_bytes
+from wi_pdf import MM_PER_INCH, WorkInstructionPDF
+from wi_render import RenderOptions
+from wi_spec import spec_digest
+
+DEFAULT_PREVIEW_DPI = 60
+DEFAULT_CACHE_MB = 16
+THUMB_CACHE_SIZE = 256
+PREVIEW_CACHE_SIZE = 32
+BLACK = (0, 0, 0)
+
+
+class _LRU:
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size=0):
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (value, size)
+            self.size += size
+            while len(self._entries) > 1 and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self.size > self.max_bytes)
+            ):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+_thumbs = _LRU(max_entries=THUMB_CACHE_SIZE)  # (content hash, width px) -> RGB thumbnail
+_pages = _LRU(max_bytes=int(float(os.environ.get("WI_PREVIEW_CACHE_MB", DEFAULT_CACHE_MB)) * 1024 * 1024))
+_previews = _LRU(max_entries=PREVIEW_CACHE_SIZE)  # (spec digest, dpi) -> page PNGs
+
+
+def _thumbnail(data, width_px):
+    with Image.open(BytesIO(data)) as source:
+        # Lets JPEG decoding skip straight to roughly the thumbnail size
+        source.draft("RGB", (width_px, width_px * 4))
+        im = ImageOps.exif_transpose(source).convert("RGBA")
+    height = max(1, round(im.height * width_px / im.width))
+    im = im.resize((width_px, height), Image.LANCZOS)
+    flat = Image.new("RGB", im.size, "white")
+    flat.paste(im, mask=im.getchannel("A"))
+    return flat
+
+
+class _PageRecorder(WorkInstructionPDF):
+    """Runs the PDF layout, recording draw operations per page instead of writing a PDF."""
+
+    def __init__(self, spec, dpi):
+        super().__init__(spec, RenderOptions(), image_dir=None)
+        self.dpi = dpi
+        self.thumbs = {}  # the thumbnails this document uses, so eviction cannot lose one before drawing
+        self.keys = {}  # id(picture) -> thumbnail key, for pictures shared between steps
+        self.ops = []
+        self.fill_rgb = (255, 255, 255)
+        self.text_rgb = BLACK
+
+    def page_ops(self):
+        while len(self.ops) < self.page:
+            self.ops.append([])
+        return self.ops[self.page - 1]
+
+    def picture_file(self, img, width_in):
+        key = self.keys.get((id(img), width_in))
+        if key is None:
+            data = read_image_bytes(img)
+            key = self.keys[id(img), width_in] = (content_hash(data), round(width_in * self.dpi))
+            if key not in self.thumbs:
+                thumb = _thumbs.get(key)
+                if thumb is None:
+                    thumb = _thumbnail(data, key[1])
+                    _thumbs.put(key, thumb)
+                self.thumbs[key] = thumb
+        thumb = self.thumbs[key]
+        return key, thumb.height / thumb.width
+
+    def image(self, name, x=None, y=None, w=0, h=0, *args, **kwargs):
+        self.page_ops().append(("image", name, x, y, w, h))
+
+    def rect(self, x, y, w, h, style=""):
+        self.page_ops().append(("rect", x, y, w, h, self.fill_rgb if "F" in style.upper() else None))
+
+    def set_fill_color(self, r, g=-1, b=-1):
+        self.fill_rgb = (r, r, r) if g == -1 else (r, g, b)
+        super().set_fill_color(r, g, b)
+
+    def set_text_color(self, r, g=-1, b=-1):
+        self.text_rgb = (r, r, r) if g == -1 else (r, g, b)
+        super().set_text_color(r, g, b)
+
+    def cell(self, w, h=0, txt="", border=0, ln=0, align="", fill=0, link=""):
+        # Break the page first, as fpdf would, so the cell is recorded where it ends up
+        if self.y + h > self.page_break_trigger and not self.in_footer and self.accept_page_break():
+            x = self.x
+            self.add_page(self.cur_orientation)
+            self.x = x
+        width = w or self.w - self.r_margin - self.x
+        if border == 1 or fill == 1:
+            self.rect(self.x, self.y, width, h, "DF" if fill == 1 else "D")
+        if txt != "":
+            if align == "R":
+                dx = width - self.c_margin - self.get_string_width(txt)
+            elif align == "C":
+                dx = (width - self.get_string_width(txt)) / 2
+            else:
+                dx = self.c_margin
+            baseline = self.y + 0.5 * h + 0.3 * self.font_size
+            self.page_ops().append(("text", self.x + dx, baseline, self.get_string_width(txt), txt,
+                                    self.font_size_pt, "B" in self.font_style, self.text_rgb))
+        super().cell(w, h, txt, 0, ln, align, 0, link)
+
+    def finish(self):
+        # The last page's footer; FPDF.close() would also serialize the whole PDF
+        self.in_footer = 1
+        self.footer()
+        self.in_footer = 0
+        total = str(len(self.ops))
+        return [
+            [op[:4] + (op[4].replace(self.str_alias_nb_pages, total),) + op[5:] if op[0] == "text" else op for op in ops]
+            for ops in self.ops
+        ]
+
+
+# Arial or a metric-compatible face where installed, so lines fill the width the layout gave them
+FONT_FILES = {
+    False: ["arial.ttf", "LiberationSans-Regular.ttf", "DejaVuSans.ttf"],
+    True: ["arialbd.ttf", "LiberationSans-Bold.ttf", "DejaVuSans-Bold.ttf"],
+}
+
+
+@lru_cache(maxsize=None)
+def _font(size_px, bold):
+    for name in FONT_FILES[bold]:
+        try:
+            return ImageFont.truetype(name, size_px)
+        except OSError:
+            pass
+    return ImageFont.load_default(size_px)
+
+
+def _draw_page(ops, page_size, dpi, thumbs):
+    scale = dpi / MM_PER_INCH
+    im = Image.new("RGB", tuple(round(v * scale) for v in page_size), "white")
+    draw = ImageDraw.Draw(im)
+    for op in ops:
+        if op[0] == "rect":
+            _, x, y, w, h, fill = op
+            draw.rectangle([x * scale, y * scale, (x + w) * scale, (y + h) * scale], fill=fill, outline=BLACK)
+        elif op[0] == "text":
+            _, x, baseline, width, text, size_pt, bold, color = op
+            size = max(4, round(size_pt * dpi / 72))
+            font = _font(size, bold)
+            length = font.getlength(text)
+            if length > width * scale and size > 4:
+                # Wider than the PDF font: shrink to fit the space the layout measured
+                font = _font(max(4, int(size * width * scale / length)), bold)
+            draw.text(((x + width / 2) * scale, baseline * scale), text, fill=color, font=font, anchor="ms")
+        else:
+            _, key, x, y, w, h = op
+            size = (max(1, round(w * scale)), max(1, round(h * scale)))
+            im.paste(thumbs[key].resize(size, Image.BILINEAR), (round(x * scale), round(y * scale)))
+    out = BytesIO()
+    im.save(out, "PNG", optimize=False)
+    return out.getvalue()
+
+
+def preview_pages(spec, dpi=DEFAULT_PREVIEW_DPI, digest=None):
+    """Return ``(pages, drawn)``: PNG bytes for every page of ``spec`` and how many had to be drawn afresh."""
+    digest = digest or spec_digest(spec)
+    pages = _previews.get((digest, dpi))
+    if pages is not None:
+        return pages, 0
+    recorder = _PageRecorder(spec, dpi)
+    recorder.build()
+    page_size = (recorder.w, recorder.h)
+    pages, drawn = [], 0
+    for ops in recorder.finish():
+        key = content_hash(repr((ops, page_size, dpi)).encode("utf-8"))
+        png = _pages.get(key)
+        if png is None:
+            png = _draw_page(ops, page_size, dpi, recorder.thumbs)
+            _pages.put(key, png, len(png))
+            drawn += 1
+        pages.append(png)
+    _previews.put((digest, dpi), pages)
+    return pages, drawn
+
+
+def clear_preview_cache():
+    _thumbs.clear()
+    _pages.clear()
+    _previews.clear()
@@ -0,0 +1,117 @@
+"""Opt-in timing and profiling of Work Instruction renders.
+
+A ``RenderProfile`` is handed to the renderer through
+``RenderOptions.profile``; every instrumented phase adds its wall time to it.
+Phases are accumulated by name, so a phase entered once per step (such as
+``images``) reports its total. Nested phases are counted inside their parent
+as well: ``images`` is part of ``procedure``, which is part of ``body``.
+
+Profiling is off unless ``WI_PROFILE`` is set in the environment (``1`` for
+timings, ``cprofile`` to also capture a cProfile of the whole render). With no
+profile attached the instrumentation costs nothing but a ``None`` check.
+
+Only one cProfile can be active in a process at a time (Python 3.12+ refuses
+a second one), so a render that starts while another is being profiled keeps
+its timings but gets no cProfile.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+PROFILE_ENV = "WI_PROFILE"
+
+logger = logging.getLogger("wi_profile")
+
+_cprofile_lock = threading.Lock()
+
+
+def profiling_mode():
+    """Return ``None``, ``"timings"`` or ``"cprofile"`` from the ``WI_PROFILE`` environment variable."""
+    value = os.environ.get(PROFILE_ENV, "").strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return None
+    return "cprofile" if value == "cprofile" else "timings"
+
+
+class RenderProfile:
+    """Wall time per render phase, plus an optional cProfile of the whole run."""
+
+    def __init__(self, cprofile=False):
+        self.phases = {}
+        self.calls = {}
+        self.total = 0.0
+        self.profiler = cProfile.Profile() if cprofile else None
+        self.captured = False
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    @contextmanager
+    def run(self):
+        """Wrap a complete render: measures the total and drives cProfile if enabled."""
+        start = time.perf_counter()
+        profiling = self.profiler is not None and _cprofile_lock.acquire(blocking=False)
+        if profiling:
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Some other profiler or debugger is active
+                _cprofile_lock.release()
+                profiling = False
+        try:
+            yield self
+        finally:
+            if profiling:
+                self.profiler.disable()
+                _cprofile_lock.release()
+                self.captured = True
+            self.total += time.perf_counter() - start
+
+    def stats_text(self, limit=30, sort="cumulative"):
+        if not self.captured:
+            return ""
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def to_dict(self):
+        return {
+            "total_ms": round(self.total * 1000, 3),
+            "phases": {
+                name: {"ms": round(seconds * 1000, 3), "calls": self.calls[name]}
+                for name, seconds in self.phases.items()
+            },
+        }
+
+    def log(self, **fields):
+        """Emit the timings as one JSON log record, with ``fields`` merged in."""
+        record = {"event": "wi_render", **fields, **self.to_dict()}
+        logger.info(json.dumps(record, sort_keys=True))
+        return record
+
+
+def phase(profile, name):
+    """``profile.phase(name)``, or a no-op context when ``profile`` is None."""
+    return profile.phase(name) if profile is not None else nullcontext()
+
+
+def configure_logging():
+    """Send render and startup records to stderr as bare JSON lines if nothing else handles them."""
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
@@ -0,0 +1,514 @@
+"""Headless rendering of Work Instruction documents.
+
+The Streamlit app and the batch CLI both describe a Work Instruction as a
+``WorkInstructionSpec`` and hand it to ``render_docx()``; nothing in here
+touches Streamlit state.
+"""
+import itertools
+from dataclasses import dataclass
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from docx.shared import Emu, Inches, Pt
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import nsdecls, qn
+from docx.oxml import OxmlElement, parse_xml
+
+from wi_fragments import cached_fragment, fragment_key
+from wi_images import DEFAULT_DPI, content_hash, normalize_image, read_image_bytes
+from wi_ppe import PPE_OPTIONS, ppe_icon, selected_ppe
+from wi_profile import phase
+from wi_spec import (  # the spec API is also imported from here
+    DEFAULT_CLAUSES, DEPT_PREFIX_MAP, PPE_CLAUSE, STEP_PICTURE_WIDTH_IN, WorkInstructionSpec, clause_kind, load_spec,
+    spec_digest,
+)
+from wi_template import new_document
+
+
+@dataclass
+class RenderOptions:
+    """Knobs that change how a spec is rendered, not what it contains."""
+    # Step pictures are resampled for this print resolution; None embeds them as uploaded
+    image_dpi: int = DEFAULT_DPI
+    # Reference named styles defined once in styles.xml instead of formatting every run and cell
+    styled: bool = False
+    # wi_profile.RenderProfile collecting per-phase timings; None disables instrumentation
+    profile: object = None
+    # Called with no arguments after each step picture is prepared, for progress reporting
+    progress: object = None
+
+
+def _picture_stream(img, width_in, options):
+    try:
+        with phase(options.profile, "images"):
+            if options.image_dpi:
+                return BytesIO(normalize_image(img, width_in, options.image_dpi))
+            return BytesIO(read_image_bytes(img))
+    finally:
+        if options.progress is not None:
+            options.progress()
+
+
+def _timed_clauses(spec, options):
+    # enumerate(spec.clauses, 1), timing the caller's loop body for each clause
+    for idx, (title, content) in enumerate(spec.clauses, 1):
+        with phase(options.profile, clause_kind(title)):
+            yield idx, (title, content)
+
+
+def build_document(spec, options=None):
+    """Build the python-docx Document for a Work Instruction spec."""
+    options = options or RenderOptions()
+    with phase(options.profile, "header"):
+        doc = new_document(spec)
+
+    with phase(options.profile, "body"):
+        if options.styled:
+            _build_body_styled(doc, spec, options)
+        else:
+            _build_body(doc, spec, options)
+    return doc
+
+
+def _build_body(doc, spec, options):
+    # WI title
+    heading = doc.add_paragraph(spec.title)
+    heading.style = doc.styles['Heading 1']
+    # Set font for heading explicitly
+    for run in heading.runs:
+        run.font.name = 'Calibri'
+        r = run._element
+        r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+
+    dept_para = doc.add_paragraph(f"Department: {spec.department}")
+    for run in dept_para.runs:
+        run.font.name = 'Calibri'
+        r = run._element
+        r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+
+    # Clause entries with manual numbering
+    for idx, (title, content) in _timed_clauses(spec, options):
+        if title == "Resources required":
+            p = doc.add_paragraph()
+            run = p.add_run(f"{idx}. {title}:")
+            run.bold = True
+            run.font.name = 'Calibri'
+            r = run._element
+            r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+            res_table = doc.add_table(rows=2, cols=3)
+            res_table.style = 'Table Grid'
+            res_table.autofit = True
+            headers = ["Machine", "Material", "Man"]
+            for col, h in enumerate(headers):
+                cell = res_table.cell(0, col)
+                for paragraph in cell.paragraphs:
+                    run = paragraph.add_run(h)
+                    run.bold = True
+                    run.font.name = 'Calibri'
+                    r = run._element
+                    r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+                    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                    paragraph.paragraph_format.space_before = Pt(3)
+                    paragraph.paragraph_format.space_after = Pt(3)
+                tc = cell._tc
+                tcPr = tc.get_or_add_tcPr()
+                vAlign = OxmlElement('w:vAlign')
+                vAlign.set(qn('w:val'), 'center')
+                tcPr.append(vAlign)
+                shd = OxmlElement('w:shd')
+                shd.set(qn('w:fill'), 'B7DEE8')
+                tcPr.append(shd)
+            entries = [content["machine"], content["material"], content["man"]]
+            for col, entry in enumerate(entries):
+                cell = res_table.cell(1, col)
+                cell.text = entry
+                for paragraph in cell.paragraphs:
+                    for run in paragraph.runs:
+                        run.font.name = 'Calibri'
+                        r = run._element
+                        r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+                    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                    paragraph.paragraph_format.space_before = Pt(6)
+                    paragraph.paragraph_format.space_after = Pt(6)
+                tc = cell._tc
+                tcPr = tc.get_or_add_tcPr()
+                vAlign = OxmlElement('w:vAlign')
+                vAlign.set(qn('w:val'), 'center')
+                tcPr.append(vAlign)
+        elif title == "Procedure steps":
+            p = doc.add_paragraph()
+            run = p.add_run(f"{idx}. {title}:")
+            run.bold = True
+            run.font.name = 'Calibri'
+            r = run._element
+            r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+            steps = content
+            proc_table = doc.add_table(rows=1 + len(steps), cols=3)
+            proc_table.style = 'Table Grid'
+            proc_table.autofit = False
+            col_widths = [Inches(1/2.54), Inches(9.5/2.54), Inches(8.05/2.54)]
+            for row in proc_table.rows:
+                for col, cell in enumerate(row.cells):
+                    cell.width = col_widths[col]
+            header_cells = proc_table.rows[0].cells
+            header_cells[0].text = "#"
+            header_cells[1].text = "Detail"
+            header_cells[2].text = "Picture"
+            for col in range(3):
+                for paragraph in header_cells[col].paragraphs:
+                    for run in paragraph.runs:
+                        run.font.name = 'Calibri'
+                        r = run._element
+                        r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+                    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                    run = paragraph.runs[0] if paragraph.runs else paragraph.add_run()
+                    run.bold = True
+                    run.font.name = 'Calibri'
+                    r = run._element
+                    r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+                tc = header_cells[col]._tc
+                tcPr = tc.get_or_add_tcPr()
+                shd = OxmlElement('w:shd')
+                shd.set(qn('w:fill'), 'B7DEE8')
+                tcPr.append(shd)
+            # rows[i] rebuilds the row list on every lookup, so walk the rows once
+            for step_idx, (step, row) in enumerate(zip(steps, proc_table.rows[1:])):
+                row_cells = row.cells
+                row_cells[0].text = str(step_idx+1)
+                for paragraph in row_cells[0].paragraphs:
+                    for run in paragraph.runs:
+                        run.font.name = 'Calibri'
+                        r = run._element
+                        r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+                    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                row_cells[1].text = step["detail"]
+                for paragraph in row_cells[1].paragraphs:
+                    for run in paragraph.runs:
+                        run.font.name = 'Calibri'
+                        r = run._element
+                        r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+                    paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
+                pic_cell = row_cells[2]
+                for para in pic_cell.paragraphs:
+                    para.clear()
+                for img in step["images"]:
+                    if img is not None:
+                        try:
+                            stream = _picture_stream(img, STEP_PICTURE_WIDTH_IN, options)
+                            pic_cell.add_paragraph().add_run().add_picture(stream, width=Inches(STEP_PICTURE_WIDTH_IN))
+                        except Exception:
+                            pass
+                for paragraph in pic_cell.paragraphs:
+                    for run in paragraph.runs:
+                        run.font.name = 'Calibri'
+                        r = run._element
+                        r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+                    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        elif title == PPE_CLAUSE:
+            p = doc.add_paragraph()
+            run = p.add_run(f"{idx}. {title}:")
+            run.bold = True
+            run.font.name = 'Calibri'
+            r = run._element
+            r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+            selected_ppe_objs = selected_ppe(spec.ppe_selected)
+            if selected_ppe_objs:
+                ppe_table = doc.add_table(rows=2, cols=len(selected_ppe_objs))
+                ppe_table.autofit = True
+                ppe_table.style = 'Table Grid'
+                for col in range(len(selected_ppe_objs)):
+                    for row in range(2):
+                        cell = ppe_table.cell(row, col)
+                        cell.width = Inches(7.09 / max(1, len(selected_ppe_objs)))
+                        for paragraph in cell.paragraphs:
+                            for run in paragraph.runs:
+                                run.font.name = 'Calibri'
+                                r = run._element
+                                r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+                            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                        tc = cell._tc
+                        tcPr = tc.get_or_add_tcPr()
+                        vAlign = OxmlElement('w:vAlign')
+                        vAlign.set(qn('w:val'), 'center')
+                        tcPr.append(vAlign)
+                for col, ppe in enumerate(selected_ppe_objs):
+                    cell = ppe_table.cell(0, col)
+                    cell.paragraphs[0].add_run().add_picture(BytesIO(ppe_icon(ppe["name"])), width=Inches(1))
+                for col, ppe in enumerate(selected_ppe_objs):
+                    cell = ppe_table.cell(1, col)
+                    run = cell.paragraphs[0].add_run(ppe["name"])
+                    run.font.name = 'Calibri'
+                    r = run._element
+                    r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+            else:
+                doc.add_paragraph("No PPEs selected.")
+        else:
+            p = doc.add_paragraph()
+            run = p.add_run(f"{idx}. {title}:")
+            run.bold = True
+            run.font.name = 'Calibri'
+            r = run._element
+            r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+            para = doc.add_paragraph(content)
+            for run in para.runs:
+                run.font.name = 'Calibri'
+                r = run._element
+                r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
+
+
+# Named styles used by the styled rendering mode. They carry the Calibri font,
+# alignment, spacing, vertical centering and header shading that the classic
+# path writes onto every run and cell.
+WI_STYLES_XML = (
+    '<w:styles %s>'
+    '<w:style w:type="paragraph" w:customStyle="1" w:styleId="WIBody">'
+    '<w:name w:val="WI Body"/><w:basedOn w:val="Normal"/><w:qFormat/>'
+    '<w:rPr><w:rFonts w:ascii="Calibri" w:hAnsi="Calibri" w:eastAsia="Calibri"/></w:rPr>'
+    '</w:style>'
+    '<w:style w:type="paragraph" w:customStyle="1" w:styleId="WITitle">'
+    '<w:name w:val="WI Title"/><w:basedOn w:val="Heading1"/><w:next w:val="WIBody"/><w:qFormat/>'
+    '<w:rPr><w:rFonts w:ascii="Calibri" w:hAnsi="Calibri" w:eastAsia="Calibri"/></w:rPr>'
+    '</w:style>'
+    '<w:style w:type="paragraph" w:customStyle="1" w:styleId="WIClause">'
+    '<w:name w:val="WI Clause"/><w:basedOn w:val="WIBody"/><w:next w:val="WIBody"/>'
+    '<w:rPr><w:b/></w:rPr>'
+    '</w:style>'
+    '<w:style w:type="paragraph" w:customStyle="1" w:styleId="WICell">'
+    '<w:name w:val="WI Cell"/><w:basedOn w:val="WIBody"/>'
+    '<w:pPr><w:spacing w:after="0" w:line="240" w:lineRule="auto"/><w:jc w:val="center"/></w:pPr>'
+    '</w:style>'
+    '<w:style w:type="paragraph" w:customStyle="1" w:styleId="WICellLeft">'
+    '<w:name w:val="WI Cell Left"/><w:basedOn w:val="WICell"/>'
+    '<w:pPr><w:jc w:val="left"/></w:pPr>'
+    '</w:style>'
+    '<w:style w:type="paragraph" w:customStyle="1" w:styleId="WICellHeader">'
+    '<w:name w:val="WI Cell Header"/><w:basedOn w:val="WICell"/>'
+    '<w:rPr><w:b/></w:rPr>'
+    '</w:style>'
+    '<w:style w:type="paragraph" w:customStyle="1" w:styleId="WIResourceHeader">'
+    '<w:name w:val="WI Resource Header"/><w:basedOn w:val="WICellHeader"/>'
+    '<w:pPr><w:spacing w:before="60" w:after="60" w:line="240" w:lineRule="auto"/></w:pPr>'
+    '</w:style>'
+    '<w:style w:type="paragraph" w:customStyle="1" w:styleId="WIResourceCell">'
+    '<w:name w:val="WI Resource Cell"/><w:basedOn w:val="WICell"/>'
+    '<w:pPr><w:spacing w:before="120" w:after="120" w:line="240" w:lineRule="auto"/></w:pPr>'
+    '</w:style>'
+    '<w:style w:type="table" w:customStyle="1" w:styleId="WIGrid">'
+    '<w:name w:val="WI Grid"/><w:basedOn w:val="TableGrid"/>'
+    '<w:tcPr><w:vAlign w:val="center"/></w:tcPr>'
+    '<w:tblStylePr w:type="firstRow"><w:tcPr><w:shd w:val="clear" w:color="auto" w:fill="B7DEE8"/></w:tcPr></w:tblStylePr>'
+    '</w:style>'
+    '<w:style w:type="table" w:customStyle="1" w:styleId="WIProcedureGrid">'
+    '<w:name w:val="WI Procedure Grid"/><w:basedOn w:val="TableGrid"/>'
+    '<w:tblStylePr w:type="firstRow"><w:tcPr><w:shd w:val="clear" w:color="auto" w:fill="B7DEE8"/></w:tcPr></w:tblStylePr>'
+    '</w:style>'
+    '<w:style w:type="table" w:customStyle="1" w:styleId="WIPPEGrid">'
+    '<w:name w:val="WI PPE Grid"/><w:basedOn w:val="TableGrid"/>'
+    '<w:tcPr><w:vAlign w:val="center"/></w:tcPr>'
+    '</w:style>'
+    '</w:styles>'
+) % nsdecls("w")
+
+
+# Part of every fragment cache key; bump the number when the fragment XML helpers change
+STYLE_VERSION = "1-" + content_hash(WI_STYLES_XML.encode("utf-8"))[:12]
+
+
+def add_wi_styles(doc):
+    """Define the WI paragraph and table styles in ``doc``'s styles part."""
+    styles = doc.styles.element
+    if styles.get_by_id("WIBody") is not None:
+        return
+    for style in parse_xml(WI_STYLES_XML):
+        styles.append(style)
+
+
+def _run_xml(text):
+    # Same mapping as python-docx's run.text setter: newlines become breaks, tabs become tabs
+    parts = []
+    for i, line in enumerate(text.replace("\r\n", "\n").replace("\r", "\n").split("\n")):
+        if i:
+            parts.append("<w:br/>")
+        for j, chunk in enumerate(line.split("\t")):
+            if j:
+                parts.append("<w:tab/>")
+            if chunk:
+                space = ' xml:space="preserve"' if chunk != chunk.strip() else ""
+                parts.append(f"<w:t{space}>{escape(chunk)}</w:t>")
+    return f"<w:r>{''.join(parts)}</w:r>"
+
+
+def _p_xml(style, text=None, runs=""):
+    if text:
+        runs = _run_xml(text) + runs
+    return f'<w:p><w:pPr><w:pStyle w:val="{style}"/></w:pPr>{runs}</w:p>'
+
+
+def _table_start_xml(style, grid_cols, fixed=False):
+    layout = '<w:tblLayout w:type="fixed"/>' if fixed else ""
+    grid = "".join(f'<w:gridCol w:w="{w}"/>' for w in grid_cols)
+    return (
+        f'<w:tbl><w:tblPr><w:tblStyle w:val="{style}"/><w:tblW w:w="0" w:type="auto"/>{layout}'
+        '<w:tblLook w:val="04A0" w:firstRow="1" w:lastRow="0" w:firstColumn="1" w:lastColumn="0" w:noHBand="0" w:noVBand="1"/>'
+        f'</w:tblPr><w:tblGrid>{grid}</w:tblGrid>'
+    )
+
+
+def _tr_xml(cell_widths, cells):
+    tcs = "".join(
+        f'<w:tc><w:tcPr><w:tcW w:w="{w}" w:type="dxa"/></w:tcPr>{content}</w:tc>'
+        for w, content in zip(cell_widths, cells)
+    )
+    return f"<w:tr>{tcs}</w:tr>"
+
+
+def drawing_xml(shape_id, rId, filename, cx, cy):
+    """Inline picture run content, equivalent to python-docx's ``CT_Inline.new_pic_inline``."""
+    return (
+        f'<w:r><w:drawing><wp:inline distT="0" distB="0" distL="0" distR="0" {nsdecls("a", "pic")}>'
+        f'<wp:extent cx="{cx}" cy="{cy}"/><wp:docPr id="{shape_id}" name="Picture {shape_id}"/>'
+        '<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+        '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+        f'<pic:pic><pic:nvPicPr><pic:cNvPr id="0" name="{escape(filename)}"/><pic:cNvPicPr/></pic:nvPicPr>'
+        f'<pic:blipFill><a:blip r:embed="{rId}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+        f'<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+        '<a:prstGeom prst="rect"/></pic:spPr></pic:pic></a:graphicData></a:graphic></wp:inline></w:drawing></w:r>'
+    )
+
+
+def _parse(xml):
+    # Fragments are written without namespace declarations; add them to the root tag
+    return parse_xml(xml.replace(">", f' {nsdecls("w", "wp", "r")}>', 1))
+
+
+def styled_body_chunks(spec, options, block_width, add_picture):
+    """Yield the body of a styled document as a sequence of XML strings.
+
+    Tables are yielded row by row so a caller can stream arbitrarily long
+    procedures. ``add_picture(image, width)`` embeds an image (path or stream)
+    and returns the run XML that displays it.
+    """
+    picture = skip_unreadable(add_picture)
+    yield title_xml(spec)
+
+    for idx, (title, content) in _timed_clauses(spec, options):
+        yield from clause_chunks(idx, title, content, spec, options, block_width, picture)
+
+
+def title_xml(spec):
+    return _p_xml("WITitle", spec.title) + _p_xml("WIBody", f"Department: {spec.department}")
+
+
+def skip_unreadable(add_picture):
+    def picture(img, width):
+        # Unreadable pictures are skipped, as in the classic path
+        try:
+            return add_picture(BytesIO(img) if isinstance(img, bytes) else img, width)
+        except Exception:
+            return None
+    return picture
+
+
+def _grid(block_width, cols):
+    return [Emu(block_width // cols).twips] * cols
+
+
+PROCEDURE_COL_WIDTHS = [Inches(1/2.54).twips, Inches(9.5/2.54).twips, Inches(8.05/2.54).twips]
+
+
+def procedure_start_xml(block_width):
+    """Opening of the procedure table up to and including its header row."""
+    return (
+        _table_start_xml("WIProcedureGrid", _grid(block_width, 3), fixed=True)
+        + _tr_xml(PROCEDURE_COL_WIDTHS, [_p_xml("WICellHeader", h) for h in ["#", "Detail", "Picture"]])
+    )
+
+
+def step_row_xml(step_idx, step, options, picture):
+    def step_picture(img):
+        # Unreadable or missing pictures are skipped, as in the classic path
+        try:
+            stream = _picture_stream(img, STEP_PICTURE_WIDTH_IN, options)
+        except Exception:
+            return None
+        return picture(stream, Inches(STEP_PICTURE_WIDTH_IN))
+
+    pictures = [step_picture(img) for img in step["images"] if img is not None]
+    return _tr_xml(PROCEDURE_COL_WIDTHS, [
+        _p_xml("WICell", str(step_idx+1)),
+        _p_xml("WICellLeft", step["detail"]),
+        _p_xml("WICell") + "".join(_p_xml("WICell", runs=run) for run in pictures if run),
+    ])
+
+
+def clause_chunks(idx, title, content, spec, options, block_width, picture):
+    """Yield the heading and content of clause number ``idx`` as XML strings."""
+    yield _p_xml("WIClause", f"{idx}. {title}:")
+    kind = clause_kind(title)
+    if kind == "procedure":
+        yield procedure_start_xml(block_width)
+        for step_idx, step in enumerate(content):
+            yield step_row_xml(step_idx, step, options, picture)
+        yield "</w:tbl>"
+        return
+    # Everything but the procedure depends only on its content, so it can come from the fragment cache
+    ppe_selected = [ppe["name"] for ppe in selected_ppe(spec.ppe_selected)] if kind == "ppe" else None
+    key = fragment_key(STYLE_VERSION, kind, content if kind != "ppe" else None, ppe_selected, block_width)
+    yield cached_fragment(key, lambda pic: _clause_body_chunks(kind, content, ppe_selected, block_width, pic), picture)
+
+
+def _clause_body_chunks(kind, content, ppe_selected, block_width, picture):
+    if kind == "resources":
+        widths = _grid(block_width, 3)
+        entries = [content["machine"], content["material"], content["man"]]
+        yield _table_start_xml("WIGrid", widths)
+        yield _tr_xml(widths, [_p_xml("WIResourceHeader", h) for h in ["Machine", "Material", "Man"]])
+        yield _tr_xml(widths, [_p_xml("WIResourceCell", entry) for entry in entries])
+        yield "</w:tbl>"
+    elif kind == "ppe":
+        selected_ppe_objs = selected_ppe(ppe_selected)
+        if selected_ppe_objs:
+            n = len(selected_ppe_objs)
+            widths = [Inches(7.09 / n).twips] * n
+            icons = [picture(ppe_icon(ppe["name"]), Inches(1)) for ppe in selected_ppe_objs]
+            yield _table_start_xml("WIPPEGrid", _grid(block_width, n))
+            yield _tr_xml(widths, [_p_xml("WICell", runs=icon or "") for icon in icons])
+            yield _tr_xml(widths, [_p_xml("WICell", ppe["name"]) for ppe in selected_ppe_objs])
+            yield "</w:tbl>"
+        else:
+            yield _p_xml("WIBody", "No PPEs selected.")
+    else:
+        yield _p_xml("WIBody", content)
+
+
+def block_width(doc):
+    section = doc.sections[0]
+    return section.page_width - section.left_margin - section.right_margin
+
+
+def _build_body_styled(doc, spec, options):
+    add_wi_styles(doc)
+    part = doc.part
+    shape_ids = itertools.count(part.next_id)
+
+    def add_picture(img, width):
+        # Like run.add_picture(), but without rescanning the whole part for the next shape id
+        rId, image = part.get_or_add_image(img)
+        cx, cy = image.scaled_dimensions(width, None)
+        return drawing_xml(next(shape_ids), rId, image.filename, cx, cy)
+
+    chunks = styled_body_chunks(spec, options, block_width(doc), add_picture)
+    fragment = _parse(f"<w:body>{''.join(chunks)}</w:body>")
+    body = doc.element.body
+    for el in list(fragment):
+        if body.sectPr is not None:
+            body.sectPr.addprevious(el)
+        else:
+            body.append(el)
+
+
+def render_docx(spec, options=None):
+    """Render a spec and return the DOCX file as bytes."""
+    file_stream = BytesIO()
+    build_document(spec, options).save(file_stream)
+    return file_stream.getvalue()
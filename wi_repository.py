@@ -0,0 +1,347 @@
+"""Local repository of generated Work Instructions.
+
+Every generated WI is recorded in a SQLite database together with its spec;
+the DOCX, PDF and step pictures go to a content-addressed object store next to
+it (``objects/ab/cdef...``, named by SHA-256), so identical files are stored
+once however many revisions share them.
+
+Document numbers are split into a prefix and a numeric sequence
+(``FUR/L3/`` + ``007``) and indexed on ``(prefix, seq)``, so the next free
+number for a department is a single index lookup however many documents the
+repository holds. The suggested number is not reserved, so ``save()``
+refuses to replace a saved revision that holds a different document (another
+department or title) or was saved by another session, unless told to with
+``replace=True``; it raises ``DocumentConflict`` instead.
+
+The latest revision of every document is also kept in an SQLite FTS5
+full-text index over its number, title, department, clause texts, resources
+and step details, so ``search()`` answers in milliseconds without opening any
+DOCX. Repositories created before the index existed are indexed when they are
+first opened.
+
+The repository lives in ``WI_REPO_DIR`` (default: ``wi_repository`` next to
+this file).
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+from wi_images import content_hash, read_image_bytes
+from wi_output import CHUNK_SIZE
+from wi_spec import BASE_DIR, WorkInstructionSpec, clause_kind
+
+DEFAULT_REPO_DIR = os.path.join(BASE_DIR, "wi_repository")
+SEQ_WIDTH = 3
+SCHEMA_VERSION = 3  # 2: full-text index, 3: owner
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    prefix TEXT NOT NULL,
+    seq INTEGER,
+    doc_no TEXT NOT NULL,
+    rev_no TEXT NOT NULL,
+    department TEXT NOT NULL,
+    title TEXT NOT NULL,
+    spec_json TEXT NOT NULL,
+    spec_digest TEXT NOT NULL,
+    docx_hash TEXT,
+    pdf_hash TEXT,
+    owner TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    UNIQUE (doc_no, rev_no)
+);
+CREATE INDEX IF NOT EXISTS documents_prefix_seq ON documents (prefix, seq);
+CREATE INDEX IF NOT EXISTS documents_department ON documents (department, updated_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5 (
+    doc_no, title, department, clauses, resources, steps,
+    prefix = '2 3', tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+_DOC_NO_RE = re.compile(r"^(.*?)(\d+)$")
+_WORD_RE = re.compile(r"\w+")
+
+
+def split_doc_no(doc_no):
+    """``"FUR/L3/007"`` -> ``("FUR/L3/", 7)``; numbers without a numeric tail get seq None."""
+    match = _DOC_NO_RE.match(doc_no.strip())
+    if match is None:
+        return doc_no.strip(), None
+    return match.group(1), int(match.group(2))
+
+
+def format_doc_no(prefix, seq):
+    return f"{prefix}{seq:0{SEQ_WIDTH}d}"
+
+
+def file_stem(spec):
+    """Download name for a spec, e.g. ``FUR-L3-007_rev01``."""
+    doc_no = re.sub(r"[^\w.-]+", "-", spec.doc_no.strip()).strip("-") or "work_instruction"
+    rev = re.sub(r"[^\w.-]+", "-", spec.rev_no.strip())
+    return f"{doc_no}_rev{rev}" if rev else doc_no
+
+
+def search_fields(spec):
+    """The text of ``spec`` by full-text index column."""
+    clauses, resources, steps = [], [], []
+    for title, content in spec.clauses:
+        kind = clause_kind(title)
+        if kind == "resources":
+            resources += [content.get("machine", ""), content.get("material", ""), content.get("man", "")]
+        elif kind == "procedure":
+            steps += [step["detail"] for step in content]
+        elif isinstance(content, str):
+            clauses.append(content)
+    return (spec.doc_no, spec.title, spec.department, "\n".join(clauses), "\n".join(resources), "\n".join(steps))
+
+
+def match_query(text):
+    """FTS5 query matching documents that contain every word of ``text``, the words taken as prefixes."""
+    return " ".join(f'"{word}"*' for word in _WORD_RE.findall(text))
+
+
+class DocumentConflict(Exception):
+    """Raised by ``save()`` when the doc_no/rev_no already holds another document or another session's save."""
+
+    def __init__(self, row):
+        super().__init__(f"{row['doc_no']} rev {row['rev_no']} is already saved as "
+                         f"\"{row['title']}\" ({row['department']})")
+        self.row = row
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class WorkInstructionRepository:
+    """SQLite index plus content-addressed object store. Safe to share between threads."""
+
+    def __init__(self, root=None):
+        self.root = root or os.environ.get("WI_REPO_DIR") or DEFAULT_REPO_DIR
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.db_path = os.path.join(self.root, "index.sqlite3")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                if "owner" not in [row["name"] for row in conn.execute("PRAGMA table_info(documents)")]:
+                    conn.execute("ALTER TABLE documents ADD COLUMN owner TEXT")
+                if version < 2:
+                    self._reindex(conn)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _connect(self):
+        # One connection per thread; render workers and script threads each get their own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # -- object store -----------------------------------------------------
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def put_blob(self, data):
+        """Store bytes, or a whole binary file copied in chunks, and return its content hash."""
+        is_file = hasattr(data, "read")
+        if is_file:
+            data.seek(0)
+            sha = hashlib.sha256()
+            for chunk in iter(lambda: data.read(CHUNK_SIZE), b""):
+                sha.update(chunk)
+            digest = sha.hexdigest()
+        else:
+            digest = content_hash(data)
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                if is_file:
+                    data.seek(0)
+                    shutil.copyfileobj(data, f, CHUNK_SIZE)
+                else:
+                    f.write(data)
+            os.replace(tmp, path)
+        return digest
+
+    def get_blob(self, digest):
+        with open(self.object_path(digest), "rb") as f:
+            return f.read()
+
+    # -- documents --------------------------------------------------------
+
+    def next_doc_no(self, prefix):
+        row = self._connect().execute("SELECT MAX(seq) FROM documents WHERE prefix = ?", (prefix,)).fetchone()
+        return format_doc_no(prefix, (row[0] or 0) + 1)
+
+    def conflict(self, spec, owner=None):
+        """The saved row ``save(spec, owner=owner)`` would refuse to replace, or None."""
+        return self._conflict(self._connect(), spec, owner)
+
+    def _conflict(self, conn, spec, owner):
+        row = conn.execute("SELECT * FROM documents WHERE doc_no = ? AND rev_no = ?",
+                           (spec.doc_no.strip(), spec.rev_no.strip())).fetchone()
+        if row is not None and (row["department"], row["title"], row["owner"]) != (spec.department, spec.title, owner):
+            return row
+        return None
+
+    def save(self, spec, digest, docx=None, pdf=None, owner=None, replace=False):
+        """Record ``spec`` and its rendered files (bytes or binary files) and return the saved row.
+
+        ``owner`` identifies the saving session. Re-saving a doc_no/rev_no
+        replaces that revision only if it holds the same department and title
+        saved by the same owner, or if ``replace``; otherwise
+        ``DocumentConflict`` is raised.
+        """
+        def image_ref(img):
+            # Stored relative to the repository root so load_spec-style resolution finds it
+            return os.path.relpath(self.object_path(self.put_blob(read_image_bytes(img))), self.root)
+
+        spec_json = json.dumps(spec.to_dict(image_ref), sort_keys=True)
+        prefix, seq = split_doc_no(spec.doc_no)
+        docx_hash = self.put_blob(docx) if docx is not None else None
+        pdf_hash = self.put_blob(pdf) if pdf is not None else None
+        now = _now()
+        with self._connect() as conn:
+            # Write-locked before the check, so two sessions saving the same number cannot both pass it
+            conn.execute("BEGIN IMMEDIATE")
+            existing = None if replace else self._conflict(conn, spec, owner)
+            if existing is not None:
+                raise DocumentConflict(existing)
+            conn.execute(
+                """INSERT INTO documents (prefix, seq, doc_no, rev_no, department, title, spec_json, spec_digest,
+                                          docx_hash, pdf_hash, owner, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (doc_no, rev_no) DO UPDATE SET
+                       department = excluded.department, title = excluded.title,
+                       spec_json = excluded.spec_json, spec_digest = excluded.spec_digest,
+                       docx_hash = excluded.docx_hash, pdf_hash = excluded.pdf_hash,
+                       owner = excluded.owner, updated_at = excluded.updated_at""",
+                (prefix, seq, spec.doc_no.strip(), spec.rev_no.strip(), spec.department, spec.title, spec_json,
+                 digest, docx_hash, pdf_hash, owner, now, now),
+            )
+            # Not RETURNING: that needs SQLite 3.35, newer than some supported distributions ship
+            doc_id = conn.execute("SELECT id FROM documents WHERE doc_no = ? AND rev_no = ?",
+                                  (spec.doc_no.strip(), spec.rev_no.strip())).fetchone()[0]
+            if self._latest_id(conn, spec.doc_no.strip()) == doc_id:
+                conn.execute("DELETE FROM documents_fts WHERE rowid IN (SELECT id FROM documents WHERE doc_no = ?)",
+                             (spec.doc_no.strip(),))
+                self._index(conn, doc_id, spec)
+        return self.get_by_id(doc_id)
+
+    def _latest_id(self, conn, doc_no):
+        return conn.execute("SELECT id FROM documents WHERE doc_no = ? ORDER BY CAST(rev_no AS INTEGER) DESC, rev_no DESC "
+                            "LIMIT 1", (doc_no,)).fetchone()[0]
+
+    def _index(self, conn, doc_id, spec):
+        conn.execute("INSERT INTO documents_fts (rowid, doc_no, title, department, clauses, resources, steps) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)", (doc_id, *search_fields(spec)))
+
+    def _reindex(self, conn):
+        # Hits in the number or title count for more than hits in the body
+        conn.execute("INSERT INTO documents_fts (documents_fts, rank) VALUES ('rank', 'bm25(10, 10, 2, 1, 2, 1)')")
+        conn.execute("DELETE FROM documents_fts")
+        for row in conn.execute("SELECT id, doc_no, spec_json FROM documents"):
+            if self._latest_id(conn, row["doc_no"]) == row["id"]:
+                self._index(conn, row["id"], WorkInstructionSpec.from_dict(json.loads(row["spec_json"])))
+
+    def get(self, doc_no, rev_no=None):
+        """The row for ``doc_no`` at ``rev_no``, or its latest revision; None if unknown."""
+        conn = self._connect()
+        if rev_no is not None:
+            return conn.execute("SELECT * FROM documents WHERE doc_no = ? AND rev_no = ?",
+                                (doc_no, rev_no)).fetchone()
+        return conn.execute(
+            "SELECT * FROM documents WHERE doc_no = ? ORDER BY CAST(rev_no AS INTEGER) DESC, rev_no DESC LIMIT 1",
+            (doc_no,)).fetchone()
+
+    def revisions(self, doc_no):
+        return self._connect().execute(
+            "SELECT * FROM documents WHERE doc_no = ? ORDER BY CAST(rev_no AS INTEGER), rev_no", (doc_no,)).fetchall()
+
+    def recent(self, department=None, limit=20):
+        conn = self._connect()
+        if department is None:
+            return conn.execute("SELECT * FROM documents ORDER BY updated_at DESC LIMIT ?", (limit,)).fetchall()
+        return conn.execute("SELECT * FROM documents WHERE department = ? ORDER BY updated_at DESC LIMIT ?",
+                            (department, limit)).fetchall()
+
+    def get_by_id(self, doc_id):
+        return self._connect().execute("SELECT * FROM documents WHERE id = ?", (doc_id,)).fetchone()
+
+    def select(self, department=None, prefix=None, seq_from=None, seq_to=None, all_revisions=False):
+        """Rows (without spec or file columns) matching a department or a doc number prefix and range.
+
+        Only the latest revision of each document is returned unless ``all_revisions``.
+        """
+        where, params = [], []
+        if department is not None:
+            where.append("department = ?")
+            params.append(department)
+        if prefix is not None:
+            where.append("prefix = ?")
+            params.append(prefix)
+        if seq_from is not None:
+            where.append("seq >= ?")
+            params.append(seq_from)
+        if seq_to is not None:
+            where.append("seq <= ?")
+            params.append(seq_to)
+        query = "SELECT id, prefix, seq, doc_no, rev_no, department, title FROM documents"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY prefix, seq, doc_no, CAST(rev_no AS INTEGER), rev_no"
+        rows = self._connect().execute(query, params).fetchall()
+        if all_revisions:
+            return rows
+        latest = {}
+        for row in rows:
+            latest[row["doc_no"]] = row
+        return list(latest.values())
+
+    def search(self, text, department=None, limit=50, highlight=("[", "]")):
+        """Latest revisions matching every word of ``text``, best match first, each with a ``snippet``."""
+        query = match_query(text)
+        if not query:
+            return []
+        sql = """SELECT d.*, snippet(documents_fts, -1, ?, ?, '…', 12) AS snippet
+                 FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid
+                 WHERE documents_fts MATCH ?"""
+        params = [*highlight, query]
+        if department is not None:
+            sql += " AND d.department = ?"
+            params.append(department)
+        sql += " ORDER BY documents_fts.rank LIMIT ?"
+        params.append(limit)
+        return self._connect().execute(sql, params).fetchall()
+
+    def load_spec(self, row):
+        """Rebuild the ``WorkInstructionSpec`` stored in ``row``."""
+        return WorkInstructionSpec.from_dict(json.loads(row["spec_json"]), base_dir=self.root)
+
+
+_open_repositories = {}
+
+
+def open_repository(root=None):
+    """A ``WorkInstructionRepository`` shared by everything in this process that uses ``root``."""
+    repo = _open_repositories.get(root)
+    if repo is None:
+        repo = _open_repositories[root] = WorkInstructionRepository(root)
+    return repo
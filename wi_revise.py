@@ -0,0 +1,174 @@
+"""Incremental re-render for revisions of an existing Work Instruction.
+
+``revise_document()`` takes the spec and DOCX of the previous revision and
+builds the new one without redoing work that did not change. The previous
+body is split back into clauses and procedure rows (it has the same layout
+in classic and styled mode), each new clause and step is matched to an old
+one by content, and matches are deep-copied into the new document together
+with their image parts. Only changed clauses and steps go through the
+styled renderer, and only their pictures are decoded and resampled. The
+header and footer always come fresh from the cached template.
+"""
+import json
+from copy import deepcopy
+from dataclasses import replace
+from io import BytesIO
+from itertools import count
+
+from docx import Document
+from docx.oxml.ns import qn
+
+from wi_images import content_hash, read_image_bytes
+from wi_profile import phase
+from wi_render import (
+    RenderOptions, add_wi_styles, block_width, build_document, clause_chunks, clause_kind, drawing_xml,
+    procedure_start_xml, skip_unreadable, step_row_xml, title_xml, _parse, _timed_clauses,
+)
+from wi_template import new_document
+
+
+def step_key(step, hashes=None):
+    """What a procedure row depends on: the detail text and the picture contents.
+
+    ``hashes`` memoizes picture hashes by object, for steps that share uploads.
+    """
+    hashes = {} if hashes is None else hashes
+    images = []
+    for img in step["images"]:
+        if img is not None and id(img) not in hashes:
+            hashes[id(img)] = content_hash(read_image_bytes(img))
+        images.append(None if img is None else hashes[id(img)])
+    return step["detail"], tuple(images)
+
+
+def _clause_key(title, content, spec):
+    kind = clause_kind(title)
+    if kind == "procedure":
+        return None  # matched step by step instead
+    if kind == "ppe":
+        # The PPE table shows the selection, not the clause text
+        return (kind, title, tuple(spec.ppe_selected))
+    return (kind, title, json.dumps(content, sort_keys=True))
+
+
+def _old_layout(old_doc, old_spec, hashes):
+    """Map the previous body back onto ``old_spec``; None if it does not line up."""
+    body = [el for el in old_doc.element.body.iterchildren() if el.tag != qn("w:sectPr")]
+    if len(body) != 2 + 2 * len(old_spec.clauses):
+        return None
+    blocks, rows = {}, {}
+    for idx, (title, content) in enumerate(old_spec.clauses, 1):
+        block = body[2 * idx + 1]
+        key = _clause_key(title, content, old_spec)
+        if key is not None:
+            blocks.setdefault(key, block)
+            continue
+        tr = block.findall(qn("w:tr"))
+        if block.tag != qn("w:tbl") or len(tr) != 1 + len(content):
+            return None
+        for step, row in zip(content, tr[1:]):
+            rows.setdefault(step_key(step, hashes), row)
+    return blocks, rows
+
+
+class _PictureCopier:
+    """Re-points pictures in copied XML at image parts of the new document."""
+
+    def __init__(self, old_part, new_part):
+        self.old_part = old_part
+        self.new_part = new_part
+        self.rIds = {}
+
+    def __call__(self, el):
+        for blip in el.iter(qn("a:blip")):
+            old_rId = blip.get(qn("r:embed"))
+            if old_rId not in self.rIds:
+                blob = self.old_part.related_parts[old_rId].blob
+                self.rIds[old_rId] = self.new_part.get_or_add_image(BytesIO(blob))[0]
+            blip.set(qn("r:embed"), self.rIds[old_rId])
+        return el
+
+
+def _renumber_row(row, number):
+    first_cell = row.find(qn("w:tc"))
+    texts = first_cell.findall(".//" + qn("w:t"))
+    texts[0].text = str(number)
+    for t in texts[1:]:
+        t.text = ""
+
+
+def revise_document(old_spec, old_docx, spec, options=None):
+    """Build ``spec`` reusing unchanged parts of ``old_docx``, the render of ``old_spec``.
+
+    Returns ``(doc, stats)``; ``stats`` counts reused and re-rendered clauses
+    and steps. Changed content is rendered in styled mode. If the old body
+    cannot be matched to ``old_spec`` the document is built from scratch.
+    """
+    options = replace(options or RenderOptions(), styled=True)
+    stats = {"reused_clauses": 0, "rendered_clauses": 0, "reused_steps": 0, "rendered_steps": 0}
+    old_doc = Document(BytesIO(old_docx))
+    hashes = {}
+    layout = _old_layout(old_doc, old_spec, hashes)
+    if layout is None:
+        stats["rendered_clauses"] = len(spec.clauses)
+        return build_document(spec, options), stats
+    old_blocks, old_rows = layout
+
+    with phase(options.profile, "header"):
+        doc = new_document(spec)
+    with phase(options.profile, "body"):
+        add_wi_styles(doc)
+        part = doc.part
+        width = block_width(doc)
+        copy_pictures = _PictureCopier(old_doc.part, part)
+        shape_ids = count(1)
+
+        def add_picture(img, picture_width):
+            rId, image = part.get_or_add_image(img)
+            cx, cy = image.scaled_dimensions(picture_width, None)
+            return drawing_xml(next(shape_ids), rId, image.filename, cx, cy)
+
+        picture = skip_unreadable(add_picture)
+
+        def fresh(xml):
+            return list(_parse(f"<w:body>{xml}</w:body>"))
+
+        # Title, department line and clause headings are cheap and always rebuilt
+        elements = fresh(title_xml(spec))
+        for idx, (title, content) in _timed_clauses(spec, options):
+            chunks = clause_chunks(idx, title, content, spec, options, width, picture)
+            key = _clause_key(title, content, spec)
+            if key is None:
+                elements += fresh(next(chunks))
+                table = fresh(procedure_start_xml(width) + "</w:tbl>")[0]
+                for step_idx, step in enumerate(content):
+                    old_row = old_rows.get(step_key(step, hashes))
+                    if old_row is not None:
+                        row = copy_pictures(deepcopy(old_row))
+                        _renumber_row(row, step_idx + 1)
+                        stats["reused_steps"] += 1
+                        if options.progress is not None:
+                            for img in step["images"]:
+                                if img is not None:
+                                    options.progress()
+                    else:
+                        row = _parse(step_row_xml(step_idx, step, options, picture))
+                        stats["rendered_steps"] += 1
+                    table.append(row)
+                elements.append(table)
+            elif key in old_blocks:
+                elements += fresh(next(chunks))
+                elements.append(copy_pictures(deepcopy(old_blocks[key])))
+                stats["reused_clauses"] += 1
+            else:
+                elements += fresh("".join(chunks))
+                stats["rendered_clauses"] += 1
+
+        body = doc.element.body
+        for el in elements:
+            body.sectPr.addprevious(el)
+        # Copied pictures keep their old drawing ids; give every picture a unique one
+        for n, doc_pr in enumerate(body.iter(qn("wp:docPr")), 1):
+            doc_pr.set("id", str(n))
+            doc_pr.set("name", f"Picture {n}")
+    return doc, stats
@@ -0,0 +1,211 @@
+"""Work Instruction specs and the constants that describe them.
+
+Nothing in here needs python-docx, fpdf or Pillow, so the app can build its
+form and the repository can index specs without loading the renderers.
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field, fields, replace
+
+from wi_images import DEFAULT_DPI, content_hash, normalize_image, read_image_bytes
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Constants
+DEFAULT_CLAUSES = [
+    "Scope",
+    "Purpose",
+    "Frequency",
+    "Sample size",
+    "Resources required",
+    "Responsibility",
+    "Procedure steps",
+    "PPEs matrix",
+    "EHS Requirements",
+    "Reference documents",
+    "Revision history"
+]
+PPE_CLAUSE = "PPEs matrix"
+# Step pictures are printed this wide in both the DOCX and the PDF
+STEP_PICTURE_WIDTH_IN = 1.2
+
+# Department to document prefix mapping
+DEPT_PREFIX_MAP = {
+    "Quality": "QA/L3/",
+    "Batch House": "BH/L3/",
+    "Furnace": "FUR/L3/",
+    "Rolling machine": "ROM/L3/",
+    "Lehr & cutting": "LRC/L3/",
+    "Annealed Packing": "PRD/L3/",
+    "Grinding & Drilling": "GRND/L3/",
+    "Grid Printing": "GRID/L3/",
+    "ARC": "ARC/L3/",
+    "Tempering": "TEMP/L3/",
+    "Final packing": "PACK/L3/",
+    "Warehouse": "WH/L3/",
+    "Box Yard": "BY/L3/",
+    "Lab": "LAB/L3/",
+    "Mechanical": "MECH/L3/",
+    "Electrial": "ELE/L3/",
+    "Instrumentation": "INST/L3/",
+    "Utility": "UTIL/L3/",
+    "EHS": "EHS/L3/",
+    "HR": "HR/L3/",
+    "Admin": "ADMIN/L3/",
+    "Purchase": "PUR/L3/",
+    "IT": "IT/L3/",
+    "Marketing": "MKT/L3/",
+    "MR": "MR/L3/"
+}
+
+
+
+@dataclass
+class WorkInstructionSpec:
+    """Everything needed to render one Work Instruction.
+
+    ``clauses`` is a list of ``(title, content)`` pairs in document order.
+    Content is a string for plain clauses, a ``{"machine", "material", "man"}``
+    dict for "Resources required" and a list of ``{"detail", "images"}`` steps
+    for "Procedure steps". Step images may be ``None``, a file path, raw bytes
+    or a binary file-like object (e.g. a Streamlit ``UploadedFile``).
+    """
+    title: str = ""
+    department: str = ""
+    doc_no: str = ""
+    issue_date: str = ""
+    rev_no: str = "00"
+    rev_date: str = ""
+    clauses: list = field(default_factory=list)
+    ppe_selected: list = field(default_factory=list)
+    prep_by: str = ""
+    review_by: str = ""
+    approve_by: str = ""
+
+    @classmethod
+    def from_dict(cls, data, base_dir=None):
+        """Build a spec from parsed JSON/YAML.
+
+        Clauses are given as ``{"title": ..., "content": ...}`` objects; step
+        image paths are resolved relative to ``base_dir``.
+        """
+        clauses = []
+        for clause in data.get("clauses", []):
+            title, content = clause["title"], clause.get("content", "")
+            if title == "Procedure steps":
+                content = [
+                    {
+                        "detail": step.get("detail", ""),
+                        "images": [_resolve_path(img, base_dir) for img in step.get("images", [])],
+                    }
+                    for step in content
+                ]
+            elif title == "Resources required":
+                content = {key: content.get(key, "") for key in ("machine", "material", "man")}
+            clauses.append((title, content))
+        department = data.get("department", "")
+        return cls(
+            title=data.get("title", ""),
+            department=department,
+            doc_no=data.get("doc_no") or DEPT_PREFIX_MAP.get(department, "") + "001",
+            issue_date=str(data.get("issue_date", "")),
+            rev_no=str(data.get("rev_no", "00")),
+            rev_date=str(data.get("rev_date", "")),
+            clauses=clauses,
+            ppe_selected=list(data.get("ppe_selected", [])),
+            prep_by=data.get("prep_by", ""),
+            review_by=data.get("review_by", ""),
+            approve_by=data.get("approve_by", ""),
+        )
+
+    def to_dict(self, image_ref=None):
+        """Inverse of ``from_dict()``. ``image_ref(img)`` turns each step image
+        into a JSON value; by default paths are kept and other images dropped."""
+        image_ref = image_ref or (lambda img: img if isinstance(img, str) else None)
+        data = {f.name: getattr(self, f.name) for f in fields(self) if f.name != "clauses"}
+        data["clauses"] = []
+        for title, content in self.clauses:
+            if title == "Procedure steps":
+                content = [
+                    {"detail": step["detail"],
+                     "images": [None if img is None else image_ref(img) for img in step["images"]]}
+                    for step in content
+                ]
+            data["clauses"].append({"title": title, "content": content})
+        return data
+
+
+def _resolve_path(path, base_dir):
+    if path is None or base_dir is None or os.path.isabs(path):
+        return path
+    return os.path.join(base_dir, path)
+
+
+def spec_digest(spec):
+    """SHA-256 over everything that affects the rendered output, picture contents included."""
+    data = {f.name: getattr(spec, f.name) for f in fields(spec)}
+    data["clauses"] = [
+        [title, [
+            {"detail": step["detail"],
+             "images": [None if img is None else content_hash(read_image_bytes(img)) for img in step["images"]]}
+            for step in content
+        ] if title == "Procedure steps" else content]
+        for title, content in spec.clauses
+    ]
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def print_size_picture(img, dpi=DEFAULT_DPI):
+    """The bytes a step picture is printed with; unreadable pictures are returned as they are."""
+    try:
+        return normalize_image(img, STEP_PICTURE_WIDTH_IN, dpi)
+    except Exception:
+        # Left for the renderers to skip
+        return img
+
+
+def print_size_pictures(spec, dpi=DEFAULT_DPI, progress=None):
+    """Return a copy of ``spec`` whose step pictures are the bytes that get printed.
+
+    Rendering the copy gives the same documents, but it no longer references
+    the full-size uploads. ``progress()`` is called after each picture.
+    """
+    def print_size(img):
+        picture = print_size_picture(img, dpi)
+        if progress is not None:
+            progress()
+        return picture
+
+    clauses = [
+        (title, [
+            {**step, "images": [None if img is None else print_size(img) for img in step["images"]]}
+            for step in content
+        ] if title == "Procedure steps" else content)
+        for title, content in spec.clauses
+    ]
+    return replace(spec, clauses=clauses)
+
+
+def load_spec(path):
+    """Load a spec from a ``.json``, ``.yaml`` or ``.yml`` file."""
+    with open(path, encoding="utf-8") as f:
+        if path.lower().endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError("PyYAML is required to read YAML specs (pip install pyyaml)")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    return WorkInstructionSpec.from_dict(data or {}, base_dir=os.path.dirname(os.path.abspath(path)))
+
+
+def clause_kind(title):
+    if title == "Resources required":
+        return "resources"
+    if title == "Procedure steps":
+        return "procedure"
+    if title == PPE_CLAUSE:
+        return "ppe"
+    return "clauses"
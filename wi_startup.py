@@ -0,0 +1,79 @@
+"""Cold-start timing and background warm-up for the Streamlit app.
+
+The first page only needs the spec, PPE and repository modules. The renderers
+(python-docx, fpdf, Pillow), the DOCX template and the PPE icons are loaded by
+``warm_up()`` on a background thread once the first page is out, so they are
+normally ready before anyone clicks Generate; the render code imports them on
+demand if they are not.
+
+Once per server process the app's import time, the time to its first complete
+page (from the first script run and, on Linux, from process start) and the
+warm-up time are logged as one ``wi_startup`` JSON record.
+"""
+import importlib
+import json
+import os
+import threading
+import time
+
+from wi_profile import logger
+
+# The app imports this module first, so this is the start of its first script run
+_first_run = time.perf_counter()
+RENDER_MODULES = ["wi_render", "wi_revise", "wi_pdf", "wi_export", "wi_preview"]
+
+_times = {}
+_lock = threading.Lock()
+
+
+def _mark(name, seconds):
+    # The first measurement of each kind is the cold one
+    with _lock:
+        if name in _times:
+            return False
+        _times[name] = round(seconds * 1000, 1)
+        return True
+
+
+def process_age():
+    """Seconds since this process started, or None where /proc is not available."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rpartition(")")[2].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def imports_done():
+    """Call after the app's imports."""
+    _mark("imports_ms", time.perf_counter() - _first_run)
+
+
+def first_page_done():
+    """Call at the end of the app script; the first time, starts ``warm_up()`` in the background."""
+    if _mark("first_page_ms", time.perf_counter() - _first_run):
+        age = process_age()
+        if age is not None:
+            _mark("since_process_start_ms", age)
+        threading.Thread(target=warm_up, name="wi-warm-up", daemon=True).start()
+
+
+def warm_up():
+    start = time.perf_counter()
+    for name in RENDER_MODULES:
+        importlib.import_module(name)
+    from wi_ppe import load_icons
+    from wi_template import template_bytes
+
+    template_bytes()
+    load_icons()
+    _mark("warm_up_ms", time.perf_counter() - start)
+    logger.info(json.dumps({"event": "wi_startup", **startup_times()}, sort_keys=True))
+
+
+def startup_times():
+    with _lock:
+        return dict(_times)
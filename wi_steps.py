@@ -0,0 +1,196 @@
+"""Bulk entry of procedure steps.
+
+``parse_steps()`` turns pasted text or an imported file into steps: a CSV
+or markdown table with a detail column, a numbered or bulleted list, or
+plain text with one step per line (or per paragraph, if steps run over
+several lines). Table columns named like "Picture 1" may name the picture
+files that belong to each step.
+
+``assign_pictures()`` puts a batch of uploaded pictures into the steps'
+picture slots: where a table named the file, in the step its name numbers
+(``step12.jpg``, ``12.png``, ``12-b.jpg``) or otherwise in name order, one
+per step, starting with the steps that have no picture yet.
+"""
+import csv
+import os
+import re
+
+PICTURES_PER_STEP = 2
+STEPS_PER_PAGE = 10
+MAX_STEPS = 1000
+
+# Header names of the detail column, in order of preference ("Step" is often just the number)
+DETAIL_COLUMNS = ["detail", "details", "stepdetail", "stepdetails", "description", "stepdescription", "instruction",
+                  "instructions", "activity", "text", "procedure", "step"]
+
+_LIST_ITEM_RE = re.compile(r"^\s*(?:(?:step\s*)?\d+\s*[.):-]|[-*+•])\s+", re.IGNORECASE)
+_TABLE_SEPARATOR_RE = re.compile(r"^:?-+:?$")
+_PICTURE_COLUMN_RE = re.compile(r"(?:picture|pic|image|photo)s?\d*")
+_STEP_NAME_RE = re.compile(r"^(?:step[\s_-]*)?(\d+)(?:[\s_-]*(?:[a-z]|\d{1,2}|\(\d{1,2}\)))?$", re.IGNORECASE)
+
+
+def new_step(detail=""):
+    return {"detail": detail, "images": [None] * PICTURES_PER_STEP}
+
+
+def read_text(data):
+    """Decode an imported text file: UTF-8 (with or without BOM), else Windows-1252 as Excel writes it."""
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("cp1252", "replace")
+
+
+def parse_steps(text, name=""):
+    """Return ``[(detail, picture file names)]`` for the steps in ``text``.
+
+    ``name`` is the imported file's name, if any; a ``.csv`` or ``.tsv``
+    extension forces CSV, otherwise the format is recognised from the text.
+    """
+    ext = os.path.splitext(name)[1].lower()
+    lines = text.splitlines()
+    if ext in (".csv", ".tsv"):
+        return _parse_csv(text)
+    if sum(line.lstrip().startswith("|") for line in lines) >= 2:
+        return _parse_markdown_table(lines)
+    if ext not in (".md", ".txt") and lines and _is_csv_header(lines[0]):
+        return _parse_csv(text)
+    return _parse_lines(lines)
+
+
+def _csv_rows(text):
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    return [row for row in csv.reader(text.splitlines(keepends=True), dialect) if any(cell.strip() for cell in row)]
+
+
+def _is_csv_header(line):
+    rows = _csv_rows(line)
+    return bool(rows) and len(rows[0]) > 1 and _detail_column(rows[0]) is not None
+
+
+def _parse_csv(text):
+    return _rows_to_steps(_csv_rows(text))
+
+
+def _parse_markdown_table(lines):
+    rows = []
+    for line in lines:
+        line = line.strip()
+        if not line.startswith("|"):
+            continue
+        cells = [cell.strip() for cell in line.strip("|").split("|")]
+        if all(_TABLE_SEPARATOR_RE.match(cell) for cell in cells if cell):
+            continue
+        # Line breaks inside a markdown cell are written as <br>
+        rows.append([re.sub(r"<br\s*/?>", "\n", cell, flags=re.IGNORECASE) for cell in cells])
+    return _rows_to_steps(rows)
+
+
+def _column_name(cell):
+    return re.sub(r"[^a-z0-9]", "", cell.lower())
+
+
+def _detail_column(header):
+    names = [_column_name(cell) for cell in header]
+    for name in DETAIL_COLUMNS:
+        if name in names:
+            return names.index(name)
+    return None
+
+
+def _rows_to_steps(rows):
+    if not rows:
+        return []
+    header = rows[0]
+    detail_col = _detail_column(header)
+    if detail_col is not None:
+        picture_cols = [i for i, cell in enumerate(header) if _PICTURE_COLUMN_RE.fullmatch(_column_name(cell))]
+        rows = rows[1:]
+    else:
+        # No header: skip a leading column of step numbers
+        numbered = all(row[0].strip().rstrip(".").isdigit() for row in rows if row)
+        detail_col = 1 if numbered and max(len(row) for row in rows) > 1 else 0
+        picture_cols = []
+    steps = []
+    for row in rows:
+        detail = row[detail_col].strip() if detail_col < len(row) else ""
+        pictures = [row[i].strip() for i in picture_cols if i < len(row) and row[i].strip()]
+        if detail or pictures:
+            steps.append((detail, pictures))
+    return steps
+
+
+def _parse_lines(lines):
+    # Markdown headings such as "## Procedure" are not steps
+    lines = [line.rstrip() for line in lines if not re.match(r"#+\s", line.lstrip())]
+    if any(_LIST_ITEM_RE.match(line) for line in lines):
+        steps = []
+        for line in lines:
+            match = _LIST_ITEM_RE.match(line)
+            if match:
+                steps.append(line[match.end():].strip())
+            elif line.strip() and steps:
+                # A wrapped or continued item
+                steps[-1] += "\n" + line.strip()
+        return [(detail, []) for detail in steps]
+    blocks, block = [], []
+    for line in lines + [""]:
+        if line.strip():
+            block.append(line.strip())
+        elif block:
+            blocks.append(block)
+            block = []
+    if any(len(block) > 1 for block in blocks) and len(blocks) > 1:
+        return [("\n".join(block), []) for block in blocks]
+    return [(line, []) for block in blocks for line in block]
+
+
+def natural_key(name):
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+def _free_slot(step):
+    return step["images"].index(None) if None in step["images"] else None
+
+
+def _next_free_step(steps):
+    # Steps without any picture first, then second pictures
+    for wanted in (lambda step: not any(step["images"]), lambda step: _free_slot(step) is not None):
+        for step in steps:
+            if wanted(step):
+                return step
+    return None
+
+
+def assign_pictures(steps, pictures, named=None, first=0):
+    """Put ``(file name, picture)`` pairs into free picture slots of ``steps``, in place.
+
+    ``named`` maps lower-cased file names to step indexes, as listed by an
+    imported table. Step numbers in file names count from ``steps[first]``,
+    and so do pictures assigned in name order. Returns the names of the
+    pictures that found no free slot.
+    """
+    named = named or {}
+    in_order, left_over = [], []
+    for name, picture in pictures:
+        index = named.get(name.lower())
+        if index is None:
+            match = _STEP_NAME_RE.match(os.path.splitext(name)[0].strip())
+            if match and 0 < int(match.group(1)) <= len(steps) - first:
+                index = first + int(match.group(1)) - 1
+        slot = _free_slot(steps[index]) if index is not None else None
+        if slot is None:
+            in_order.append((name, picture))
+        else:
+            steps[index]["images"][slot] = picture
+    in_order.sort(key=lambda item: natural_key(item[0]))
+    for name, picture in in_order:
+        step = _next_free_step(steps[first:])
+        if step is None:
+            left_over.append(name)
+        else:
+            step["images"][_free_slot(step)] = picture
+    return left_over
@@ -0,0 +1,156 @@
+"""Streaming DOCX backend for very large procedures.
+
+``write_docx()`` never builds a python-docx tree for the body. The cached
+header/footer template provides every part except ``word/document.xml``,
+which is written into the output zip chunk by chunk as each clause and step is
+produced. Pictures are spooled to a temporary file as they are embedded and
+copied into the archive afterwards, so memory stays flat however many steps
+the procedure has.
+
+The body uses the named WI styles (see ``RenderOptions.styled``), which look
+the same as the classic ``create_docx()`` output.
+"""
+import os
+import re
+import tempfile
+import zipfile
+from io import BytesIO
+
+from docx.image.image import Image as DocxImage
+
+from wi_images import content_hash, read_image_bytes
+from wi_render import RenderOptions, add_wi_styles, block_width, drawing_xml, styled_body_chunks
+from wi_template import new_document
+
+DOCUMENT_PART = "word/document.xml"
+DOCUMENT_RELS_PART = "word/_rels/document.xml.rels"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+IMAGE_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+# Declared up front because [Content_Types].xml is written before any picture is seen
+IMAGE_CONTENT_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "gif": "image/gif",
+    "bmp": "image/bmp",
+    "tiff": "image/tiff",
+}
+CHUNK_SIZE = 64 * 1024
+
+
+class _MediaSpool:
+    """Collects embedded pictures in a temporary file, deduplicated by content."""
+
+    def __init__(self, first_image_no, first_rel_no):
+        self.spool = tempfile.TemporaryFile()
+        self.parts = []  # (partname, rId, offset, size)
+        self.by_hash = {}
+        self.image_no = first_image_no
+        self.rel_no = first_rel_no
+        self.shape_id = 1
+
+    def add_picture(self, img, width):
+        data = read_image_bytes(img)
+        digest = content_hash(data)
+        image = DocxImage.from_blob(data)
+        if digest not in self.by_hash:
+            partname = f"word/media/image{self.image_no}.{image.ext}"
+            rId = f"rId{self.rel_no}"
+            self.image_no += 1
+            self.rel_no += 1
+            offset = self.spool.tell()
+            self.spool.write(data)
+            self.parts.append((partname, rId, offset, len(data)))
+            self.by_hash[digest] = rId
+        cx, cy = image.scaled_dimensions(width, None)
+        run = drawing_xml(self.shape_id, self.by_hash[digest], f"image.{image.ext}", cx, cy)
+        self.shape_id += 1
+        return run
+
+    def write_to(self, zf):
+        for partname, _, offset, size in self.parts:
+            self.spool.seek(offset)
+            with zf.open(partname, "w") as f:
+                remaining = size
+                while remaining:
+                    chunk = self.spool.read(min(CHUNK_SIZE, remaining))
+                    f.write(chunk)
+                    remaining -= len(chunk)
+
+    def relationships_xml(self):
+        return "".join(
+            f'<Relationship Id="{rId}" Type="{IMAGE_REL_TYPE}" Target="{partname[len("word/"):]}"/>'
+            for partname, rId, _, _ in self.parts
+        )
+
+    def close(self):
+        self.spool.close()
+
+
+def _max_number(pattern, text):
+    return max((int(n) for n in re.findall(pattern, text)), default=0)
+
+
+def _content_types_xml(xml):
+    declared = set(re.findall(r'<Default Extension="([^"]+)"', xml))
+    extra = "".join(
+        f'<Default Extension="{ext}" ContentType="{content_type}"/>'
+        for ext, content_type in IMAGE_CONTENT_TYPES.items() if ext not in declared
+    )
+    return xml.replace("<Default ", extra + "<Default ", 1)
+
+
+def write_docx(spec, out, options=None):
+    """Stream the Work Instruction for ``spec`` into ``out`` (a path or writable binary file)."""
+    if isinstance(out, str):
+        # Written next to the target and renamed once complete, so a failed render leaves no truncated DOCX
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(out)), prefix=".wi_", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write_docx(spec, f, options)
+            os.replace(tmp, out)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        return
+    options = options or RenderOptions(styled=True)
+    doc = new_document(spec)
+    add_wi_styles(doc)
+    width = block_width(doc)
+    template = BytesIO()
+    doc.save(template)
+    del doc
+
+    with zipfile.ZipFile(template) as src, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        document_xml = src.read(DOCUMENT_PART).decode("utf-8")
+        rels_xml = src.read(DOCUMENT_RELS_PART).decode("utf-8")
+        body_start = document_xml.index("<w:body>") + len("<w:body>")
+        body_end = document_xml.index("<w:sectPr")
+
+        zf.writestr(CONTENT_TYPES_PART, _content_types_xml(src.read(CONTENT_TYPES_PART).decode("utf-8")))
+        for name in src.namelist():
+            if name not in (CONTENT_TYPES_PART, DOCUMENT_PART, DOCUMENT_RELS_PART):
+                zf.writestr(name, src.read(name))
+
+        media = _MediaSpool(
+            first_image_no=_max_number(r"word/media/image(\d+)\.", " ".join(src.namelist())) + 1,
+            first_rel_no=_max_number(r'Id="rId(\d+)"', rels_xml) + 1,
+        )
+        try:
+            with zf.open(DOCUMENT_PART, "w") as f:
+                f.write(document_xml[:body_start].encode("utf-8"))
+                for chunk in styled_body_chunks(spec, options, width, media.add_picture):
+                    f.write(chunk.encode("utf-8"))
+                f.write(document_xml[body_end:].encode("utf-8"))
+            media.write_to(zf)
+            zf.writestr(DOCUMENT_RELS_PART, rels_xml.replace("</Relationships>", media.relationships_xml() + "</Relationships>"))
+        finally:
+            media.close()
+
+
+def render_docx_streaming(spec, options=None):
+    """Like ``wi_render.render_docx()``, but through the streaming backend."""
+    out = BytesIO()
+    write_docx(spec, out, options)
+    return out.getvalue()
+
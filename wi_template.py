@@ -0,0 +1,267 @@
+"""Cached page setup, header and footer for Work Instruction documents.
+
+The header table (logo, company name, merged cells, row heights) and the
+approval footer (labels, PAGE/NUMPAGES fields) are identical in every Work
+Instruction. They are built once per process into a template package, and each
+render clones that package and fills in only the per-document fields. The
+template is rebuilt automatically when ``logo.jpg`` or ``COMPANY_NAME``
+changes.
+"""
+import os
+import threading
+from io import BytesIO
+
+from docx import Document
+from docx.shared import Inches, Pt
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml.ns import qn
+from docx.oxml import OxmlElement
+
+from wi_spec import BASE_DIR
+LOGO_PATH = os.path.join(BASE_DIR, "logo.jpg")  # logo must be in the same directory
+COMPANY_NAME = "BOROSIL RENEWBALES LIMITED"
+
+_template = None  # (key, docx bytes)
+_template_lock = threading.Lock()
+
+
+def _template_key():
+    try:
+        st = os.stat(LOGO_PATH)
+        logo = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        logo = None
+    return COMPANY_NAME, LOGO_PATH, logo
+
+
+def _build_template():
+    doc = Document()
+
+    # Set page margins (1.5 cm = 0.59 inches)
+    section = doc.sections[0]
+    section.top_margin = Inches(0.59)
+    section.bottom_margin = Inches(0.59)
+    section.left_margin = Inches(0.65)
+    section.right_margin = Inches(0.59)
+
+    header = section.header
+    # Remove any extra empty paragraph in header before table
+    if header.paragraphs and not header.paragraphs[0].text.strip():
+        p = header.paragraphs[0]._element
+        p.getparent().remove(p)
+
+    _build_header_skeleton(header)
+    _build_footer_skeleton(section.footer)
+
+    stream = BytesIO()
+    doc.save(stream)
+    return stream.getvalue()
+
+
+def template_bytes():
+    """Return the packaged template, rebuilding it if its inputs changed."""
+    global _template
+    key = _template_key()
+    with _template_lock:
+        if _template is None or _template[0] != key:
+            _template = (key, _build_template())
+        return _template[1]
+
+
+def new_document(spec):
+    """Return a fresh Document with the header and footer filled in for ``spec``."""
+    doc = Document(BytesIO(template_bytes()))
+    section = doc.sections[0]
+    fill_header(section.header, spec)
+    fill_footer(section.footer, spec)
+    return doc
+
+
+def clear_template():
+    global _template
+    with _template_lock:
+        _template = None
+
+
+def _build_header_skeleton(header):
+    # Header table (adjusted for margins)
+    # Total width = 8.27 (A4 width) - 0.59*2 (margins) = 7.09 inches
+    table = header.add_table(rows=4, cols=3, width=Inches(7.09))
+    table.style = 'Table Grid'
+    table.autofit = False
+    # Adjust column widths proportionally
+    widths = [Inches(1.5), Inches(3.59), Inches(2.2)]
+    for row in table.rows:
+        for idx, cell in enumerate(row.cells):
+            cell.width = widths[idx]
+
+    # Merge cells for logo
+    logo_cell = table.cell(0, 0)
+    for i in range(1, 4):
+        logo_cell.merge(table.cell(i, 0))
+    paragraph = logo_cell.paragraphs[0]
+    run = paragraph.add_run()
+    if os.path.exists(LOGO_PATH):
+        run.add_picture(LOGO_PATH, width=Inches(1.2))
+
+    # Merge cells for company name
+    name_cell = table.cell(0, 1)
+    name_cell.merge(table.cell(1, 1))
+    paragraph = name_cell.paragraphs[0]
+    run = paragraph.add_run(COMPANY_NAME)
+    run.font.size = Pt(14)  # Larger font for company name
+    run.font.bold = True
+    run.font.name = 'Arial'
+    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    # Merge cells for SOP title
+    sop_cell = table.cell(2, 1)
+    sop_cell.merge(table.cell(3, 1))
+
+    # Vertically center align all header table cells
+    for row in table.rows:
+        for cell in row.cells:
+            tc = cell._tc
+            tcPr = tc.get_or_add_tcPr()
+            vAlign = OxmlElement('w:vAlign')
+            vAlign.set(qn('w:val'), 'center')
+            tcPr.append(vAlign)
+
+    # Increase height of all header rows
+    for row in table.rows:
+        tr = row._tr
+        trPr = tr.get_or_add_trPr()
+        trHeight = OxmlElement('w:trHeight')
+        trHeight.set(qn('w:val'), '300')  # 500 twips ~0.35 cm
+        trHeight.set(qn('w:hRule'), 'exact')
+        trPr.append(trHeight)
+
+
+def fill_header(header, spec):
+    """Write the per-document fields into a cloned header table."""
+    table = header.tables[0]
+    # SOP title
+    sop_cell = table.cell(2, 1)
+    paragraph = sop_cell.paragraphs[0]
+    run = paragraph.add_run(f"WORK INSTRUCTION – {spec.title.upper()}")
+    run.font.size = Pt(12)  # Medium font for WI title
+    run.font.bold = True
+    run.font.name = 'Arial'
+    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    # Column 3 with smaller font
+    for row, text in enumerate([
+        f"DOC. NO: {spec.doc_no}",
+        f"ISSUE NO. / DATE: {spec.rev_no} / {spec.issue_date}",
+        f"REV. NO: {spec.rev_no}",
+        f"REV. DATE: {spec.rev_date}"
+    ]):
+        cell = table.cell(row, 2)
+        paragraph = cell.paragraphs[0]
+        run = paragraph.add_run(text)
+        run.font.size = Pt(9)  # Smaller font for document details
+        run.font.name = 'Arial'
+        run.font.bold = False
+
+
+def _build_footer_skeleton(footer):
+    # Add approval table to footer section (3 rows, 4 columns, last column merged)
+    footer_table = footer.add_table(rows=3, cols=4, width=Inches(7.09))
+    footer_table.style = 'Table Grid'
+    # Set column widths
+    footer_widths = [Inches(2.0), Inches(2.0), Inches(2.0), Inches(1.3)]
+    for row in footer_table.rows:
+        for idx, cell in enumerate(row.cells):
+            cell.width = footer_widths[idx]
+
+    # Merge last column for all rows (signature)
+    signature_cell = footer_table.cell(0, 3)
+    for i in range(1, 3):
+        signature_cell.merge(footer_table.cell(i, 3))
+
+    # Center align all cells vertically and horizontally
+    for row in footer_table.rows:
+        for cell in row.cells:
+            for paragraph in cell.paragraphs:
+                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            tc = cell._tc
+            tcPr = tc.get_or_add_tcPr()
+            vAlign = OxmlElement('w:vAlign')
+            vAlign.set(qn('w:val'), 'center')
+            tcPr.append(vAlign)
+
+    # Increase height of second and third row
+    for row_idx in [1, 2]:
+        tr = footer_table.rows[row_idx]._tr
+        trPr = tr.get_or_add_trPr()
+        trHeight = OxmlElement('w:trHeight')
+        trHeight.set(qn('w:val'), '500')  # 500 twips ~0.35 cm
+        trHeight.set(qn('w:hRule'), 'exact')
+        trPr.append(trHeight)
+
+    # First row: labels
+    for col, label in enumerate(["Prepared By", "Reviewed By", "Approved By"]):
+        cell = footer_table.cell(0, col)
+        cell.text = label
+        for paragraph in cell.paragraphs:
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    # Only set 'Signature' in the first row's merged cell
+    signature_paragraph = footer_table.cell(0, 3).paragraphs[0]
+    signature_paragraph.clear()
+    signature_paragraph.add_run("Signature")
+    signature_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    # Second row: names are filled in per document
+    for col in range(3):
+        cell = footer_table.cell(1, col)
+        cell.text = ""
+        for paragraph in cell.paragraphs:
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    # Leave merged cell in second row blank
+    blank_paragraph = footer_table.cell(1, 3).paragraphs[0]
+    blank_paragraph.clear()
+    blank_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    # Third row: Page x of x using Word fields
+    for col in range(3):
+        footer_table.cell(2, col).text = ""
+    # Insert Word field for page numbering only in merged cell
+    page_paragraph = footer_table.cell(2, 3).paragraphs[0]
+    page_paragraph.clear()
+    run = page_paragraph.add_run("Page ")
+    fldChar1 = OxmlElement('w:fldChar')
+    fldChar1.set(qn('w:fldCharType'), 'begin')
+    instrText1 = OxmlElement('w:instrText')
+    instrText1.text = 'PAGE'
+    fldChar2 = OxmlElement('w:fldChar')
+    fldChar2.set(qn('w:fldCharType'), 'separate')
+    fldChar3 = OxmlElement('w:fldChar')
+    fldChar3.set(qn('w:fldCharType'), 'end')
+    run._r.append(fldChar1)
+    run._r.append(instrText1)
+    run._r.append(fldChar2)
+    run._r.append(fldChar3)
+    run = page_paragraph.add_run(" of ")
+    fldChar1 = OxmlElement('w:fldChar')
+    fldChar1.set(qn('w:fldCharType'), 'begin')
+    instrText1 = OxmlElement('w:instrText')
+    instrText1.text = 'NUMPAGES'
+    fldChar2 = OxmlElement('w:fldChar')
+    fldChar2.set(qn('w:fldCharType'), 'separate')
+    fldChar3 = OxmlElement('w:fldChar')
+    fldChar3.set(qn('w:fldCharType'), 'end')
+    run._r.append(fldChar1)
+    run._r.append(instrText1)
+    run._r.append(fldChar2)
+    run._r.append(fldChar3)
+
+
+def fill_footer(footer, spec):
+    """Write the signatory names into a cloned footer table."""
+    footer_table = footer.tables[0]
+    # Second row: names from input
+    for col, name in enumerate([spec.prep_by, spec.review_by, spec.approve_by]):
+        cell = footer_table.cell(1, col)
+        cell.text = name
+        for paragraph in cell.paragraphs:
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
@@ -1,30 +1,28 @@
+from wi_startup import first_page_done, imports_done, startup_times  # first: it marks the start of the run
+
+import multiprocessing
 import streamlit as st
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
-from fpdf import FPDF
-from io import BytesIO
+from contextlib import nullcontext
 from datetime import datetime
-import os
-
-# Constants
-LOGO_PATH = "logo.jpg"  # logo must be in the same directory
-COMPANY_NAME = "BOROSIL RENEWBALES LIMITED"
-DEFAULT_CLAUSES = [
-    "Scope",
-    "Purpose",
-    "Frequency",
-    "Sample size",
-    "Resources required",
-    "Responsibility",
-    "Procedure steps",
-    "PPEs matrix",
-    "EHS Requirements",
-    "Reference documents",
-    "Revision history"
-]
+from uuid import uuid4
+
+# Only what the form needs; python-docx, fpdf and Pillow load in the background (see wi_startup)
+from wi_fragments import fragment_cache_stats
+from wi_jobs import QueueFull, RenderQueue
+from wi_ppe import PPE_OPTIONS
+from wi_profile import RenderProfile, configure_logging, phase, profiling_mode
+from wi_repository import WorkInstructionRepository, file_stem
+from wi_spec import (
+    DEFAULT_CLAUSES, DEPT_PREFIX_MAP, WorkInstructionSpec, print_size_picture, print_size_pictures, spec_digest,
+)
+from wi_steps import (
+    MAX_STEPS, PICTURES_PER_STEP, STEPS_PER_PAGE, assign_pictures, new_step, parse_steps, read_text,
+)
+
+imports_done()
+
+SERVER_BUSY = "The server is busy generating other Work Instructions. Please try again in a moment."
+EXPORT_TIMEOUT = 15 * 60  # seconds
 
 st.set_page_config(page_title="Work Instruction Generator")
 st.title("📝 Work Instruction Generator v1")
@@ -47,484 +45,505 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Input fields
-wi_title = st.text_input("Title of Work Instruction")
-
-# Department to document prefix mapping
-dept_prefix_map = {
-    "Quality": "QA/L3/",
-    "Batch House": "BH/L3/",
-    "Furnace": "FUR/L3/",
-    "Rolling machine": "ROM/L3/",
-    "Lehr & cutting": "LRC/L3/",
-    "Annealed Packing": "PRD/L3/",
-    "Grinding & Drilling": "GRND/L3/",
-    "Grid Printing": "GRID/L3/",
-    "ARC": "ARC/L3/",
-    "Tempering": "TEMP/L3/",
-    "Final packing": "PACK/L3/",
-    "Warehouse": "WH/L3/",
-    "Box Yard": "BY/L3/",
-    "Lab": "LAB/L3/",
-    "Mechanical": "MECH/L3/",
-    "Electrial": "ELE/L3/",
-    "Instrumentation": "INST/L3/",
-    "Utility": "UTIL/L3/",
-    "EHS": "EHS/L3/",
-    "HR": "HR/L3/",
-    "Admin": "ADMIN/L3/",
-    "Purchase": "PUR/L3/",
-    "IT": "IT/L3/",
-    "Marketing": "MKT/L3/",
-    "MR": "MR/L3/"
-}
 
+
+@st.cache_resource
+def load_static_assets():
+    # Once per server process; the template and PPE icons are built by the warm-up instead
+    configure_logging()
+    return DEPT_PREFIX_MAP, PPE_OPTIONS
+
+
+@st.cache_resource
+def render_queue():
+    # One pool per server process; size it with WI_RENDER_WORKERS and WI_RENDER_QUEUE
+    return RenderQueue()
+
+
+@st.cache_resource
+def repository():
+    # Every generated WI is kept here; set WI_REPO_DIR to move it
+    return WorkInstructionRepository()
+
+
+dept_prefix_map, ppe_options = load_static_assets()
+
+# Widgets that change the shape of the form live outside it so they apply immediately;
+# everything inside the form only reruns the script when the form is submitted.
 department = st.selectbox("Department", list(dept_prefix_map.keys()))
 
-# Use session state to update doc_no prefix when department changes
+# Use session state to suggest the next free doc_no when department changes
 if "last_department" not in st.session_state:
     st.session_state.last_department = department
 if "doc_no" not in st.session_state:
-    st.session_state.doc_no = dept_prefix_map.get(department, "") + "001"
+    st.session_state.doc_no = repository().next_doc_no(dept_prefix_map.get(department, ""))
 if department != st.session_state.last_department:
-    st.session_state.doc_no = dept_prefix_map.get(department, "") + "001"
+    st.session_state.doc_no = repository().next_doc_no(dept_prefix_map.get(department, ""))
     st.session_state.last_department = department
-doc_no = st.text_input("Document No:", st.session_state.doc_no, key="doc_no")
-issue_date = st.date_input("Issue Date", datetime.today())
-rev_no = st.text_input("Revision No:", "00")
-rev_date = st.date_input("Revision Date", datetime.today())
-
-
-clauses = []
-st.subheader("Clauses")
-for i, clause in enumerate(DEFAULT_CLAUSES):
-    if clause == "Resources required":
-        st.markdown(f"**{i+1}. {clause}**")
-        machine = st.text_area(f"{i+1}.1 Machine", key="machine")
-        material = st.text_area(f"{i+1}.2 Material", key="material")
-        man = st.text_area(f"{i+1}.3 Man", key="man")
-        clauses.append((clause, {"machine": machine, "material": material, "man": man}))
-    elif clause == "PPEs matrix":
-        st.markdown(f"**{i+1}. {clause}**")
-        text = st.text_area(f"{i+1}. {clause}", key=f"clause_{i}")
-        # PPEs options and images
-        ppe_options = [
-            {"name": "Goggle", "image": "goggle.png"},
-            {"name": "Shoe", "image": "shoe.png"},
-            {"name": "Helmet", "image": "helmet.png"},
-            {"name": "Gloves", "image": "gloves.png"},
-            {"name": "Mask", "image": "mask.png"},
-            {"name": "Apron", "image": "apron.png"}
-        ]
-        ppe_selected = st.multiselect("Select PPEs for PPEs Matrix", [ppe["name"] for ppe in ppe_options])
-        clauses.append((clause, text))
-    elif clause == "Procedure steps":
-        st.markdown(f"**{i+1}. {clause}**")
-        num_steps = st.number_input("Number of steps", min_value=1, max_value=20, value=1, key="num_steps")
-        steps = []
-        for step_idx in range(int(num_steps)):
-            cols = st.columns([3,1,1])
-            detail = cols[0].text_area(f"Step {step_idx+1} Detail", key=f"step_detail_{step_idx}")
-            with cols[1]:
-                st.markdown('<div style="text-align:center;margin-bottom:4px;font-size:16px;">Attach pic 1</div>', unsafe_allow_html=True)
-                img1 = st.file_uploader("Attach pic.", type=["png", "jpg", "jpeg"], key=f"step_img1_{step_idx}", label_visibility="collapsed")
-            with cols[2]:
-                st.markdown('<div style="text-align:center;margin-bottom:4px;font-size:16px;">Attach pic 2</div>', unsafe_allow_html=True)
-                img2 = st.file_uploader("Attach pic.", type=["png", "jpg", "jpeg"], key=f"step_img2_{step_idx}", label_visibility="collapsed")
-            steps.append({"detail": detail, "images": [img1, img2]})
-        clauses.append((clause, steps))
+
+# Steps live in session state; only the page of steps on screen has widgets
+if "steps" not in st.session_state:
+    st.session_state.steps = [new_step()]
+    st.session_state.upload_round = 0
+
+
+def step_pages():
+    return max(1, -(-len(st.session_state.steps) // STEPS_PER_PAGE))
+
+
+def visible_steps(page):
+    first = (page - 1) * STEPS_PER_PAGE
+    return range(first, min(first + STEPS_PER_PAGE, len(st.session_state.steps)))
+
+
+def store_visible_steps():
+    # Copy what was submitted for the page last shown back into the steps
+    steps = st.session_state.steps
+    n = st.session_state.upload_round
+    changed = False
+    for idx in visible_steps(st.session_state.get("shown_page", 1)):
+        step = steps[idx]
+        step["detail"] = st.session_state.get(f"step_detail_{idx}", step["detail"])
+        for slot in range(PICTURES_PER_STEP):
+            if st.session_state.get(f"step_remove{slot + 1}_{idx}_{n}"):
+                step["images"][slot] = None
+                changed = True
+            upload = st.session_state.get(f"step_img{slot + 1}_{idx}_{n}")
+            if upload is not None:
+                step["images"][slot] = print_size_picture(upload)
+                changed = True
+    if changed:
+        # New keys clear the uploaders and checkboxes; the pictures are kept in the steps now
+        st.session_state.upload_round += 1
+
+
+def forget_step_widgets():
+    # Steps changed behind the widgets' back: the visible page starts again from the stored steps
+    for key in [key for key in st.session_state if str(key).startswith("step_detail_")]:
+        del st.session_state[key]
+    st.session_state.upload_round += 1
+
+
+def resize_steps():
+    steps = st.session_state.steps
+    del steps[st.session_state.num_steps:]
+    steps.extend(new_step() for _ in range(st.session_state.num_steps - len(steps)))
+
+
+def turn_page(delta):
+    st.session_state.step_page = min(max(1, st.session_state.shown_page + delta), step_pages())
+
+
+def import_steps():
+    steps = st.session_state.steps
+    parsed = parse_steps(st.session_state.bulk_text)
+    if st.session_state.bulk_file is not None:
+        parsed += parse_steps(read_text(st.session_state.bulk_file.getvalue()), st.session_state.bulk_file.name)
+    pictures = st.session_state.bulk_pictures or []
+    if not parsed and not pictures:
+        return
+    empty = all(not step["detail"].strip() and not any(step["images"]) for step in steps)
+    if parsed and (st.session_state.bulk_mode == "Replace all steps" or empty):
+        del steps[:]
+    first = len(steps) if parsed else 0
+    steps.extend(new_step(detail) for detail, _ in parsed)
+    del steps[MAX_STEPS:]
+    named = {name.lower(): first + i for i, (_, names) in enumerate(parsed) for name in names}
+    left_over = assign_pictures(steps, [(f.name, print_size_picture(f)) for f in pictures], named, first)
+    forget_step_widgets()
+    st.session_state.num_steps = len(steps)
+    st.session_state.step_page = min((first // STEPS_PER_PAGE) + 1, step_pages())
+    st.session_state.bulk_result = (f"{len(parsed)} steps imported, {len(pictures) - len(left_over)} pictures assigned.",
+                                    left_over)
+
+
+def step_editor():
+    store_visible_steps()
+    pages = step_pages()
+    if st.session_state.get("step_page", 1) > pages:
+        st.session_state.step_page = pages
+    page = st.session_state.shown_page = st.session_state.get("step_page", 1)
+    n = st.session_state.upload_round
+    for idx in visible_steps(page):
+        step = st.session_state.steps[idx]
+        if f"step_detail_{idx}" not in st.session_state:
+            st.session_state[f"step_detail_{idx}"] = step["detail"]
+        cols = st.columns([3,1,1])
+        cols[0].text_area(f"Step {idx+1} Detail", key=f"step_detail_{idx}")
+        for slot, col in enumerate(cols[1:]):
+            with col:
+                st.markdown(f'<div style="text-align:center;margin-bottom:4px;font-size:16px;">Attach pic {slot + 1}</div>', unsafe_allow_html=True)
+                if step["images"][slot] is not None:
+                    st.image(step["images"][slot], width=80)
+                    st.checkbox("Remove", key=f"step_remove{slot + 1}_{idx}_{n}")
+                st.file_uploader("Attach pic.", type=["png", "jpg", "jpeg"], key=f"step_img{slot + 1}_{idx}_{n}", label_visibility="collapsed")
+    if pages > 1:
+        nav = st.columns([1, 1, 1, 2])
+        nav[0].form_submit_button("◀ Previous steps", on_click=turn_page, args=(-1,), disabled=page == 1)
+        nav[1].form_submit_button("Next steps ▶", on_click=turn_page, args=(1,), disabled=page == pages)
+        nav[2].number_input("Page", min_value=1, max_value=pages, key="step_page", label_visibility="collapsed")
+        last = visible_steps(page)[-1] + 1
+        nav[3].caption(f"Steps {visible_steps(page)[0] + 1}–{last} of {len(st.session_state.steps)}, "
+                       f"page {page} of {pages}. Any button saves this page.")
+
+
+layout_cols = st.columns(2)
+num_steps = layout_cols[0].number_input("Number of steps", min_value=1, max_value=MAX_STEPS, key="num_steps",
+                                        on_change=resize_steps)
+extra_clauses = layout_cols[1].number_input("Add Extra Clauses", min_value=0, max_value=10, step=1)
+
+with st.expander("Add steps in bulk"):
+    with st.form("bulk_steps", clear_on_submit=True):
+        st.text_area("Paste steps", key="bulk_text",
+                     help="One step per line, a numbered or bulleted list, or a table with a Detail column.")
+        st.file_uploader("Or import a CSV, markdown or text file", type=["csv", "tsv", "md", "txt"], key="bulk_file")
+        st.file_uploader("Step pictures", type=["png", "jpg", "jpeg"], accept_multiple_files=True, key="bulk_pictures",
+                         help="Files named after a step (step12.jpg, 12-b.png) go to that step; the rest go, "
+                              "in name order, to the steps without a picture.")
+        st.radio("Imported steps", ["Add after the existing steps", "Replace all steps"], key="bulk_mode", horizontal=True)
+        st.form_submit_button("Import", on_click=import_steps)
+    if "bulk_result" in st.session_state:
+        message, left_over = st.session_state.pop("bulk_result")
+        st.success(message)
+        if left_over:
+            st.warning(f"No free picture slot for: {', '.join(left_over)}")
+
+with st.form("work_instruction"):
+    # Input fields
+    wi_title = st.text_input("Title of Work Instruction")
+    doc_no = st.text_input("Document No:", key="doc_no")
+    issue_date = st.date_input("Issue Date", datetime.today())
+    rev_no = st.text_input("Revision No:", "00")
+    rev_date = st.date_input("Revision Date", datetime.today())
+    incremental = st.checkbox("Reuse unchanged clauses, steps and pictures from the saved revision", value=True,
+                              help="Only takes effect if this Document No. has been generated before.")
+
+    clauses = []
+    st.subheader("Clauses")
+    for i, clause in enumerate(DEFAULT_CLAUSES):
+        if clause == "Resources required":
+            st.markdown(f"**{i+1}. {clause}**")
+            machine = st.text_area(f"{i+1}.1 Machine", key="machine")
+            material = st.text_area(f"{i+1}.2 Material", key="material")
+            man = st.text_area(f"{i+1}.3 Man", key="man")
+            clauses.append((clause, {"machine": machine, "material": material, "man": man}))
+        elif clause == "PPEs matrix":
+            st.markdown(f"**{i+1}. {clause}**")
+            text = st.text_area(f"{i+1}. {clause}", key=f"clause_{i}")
+            ppe_selected = st.multiselect("Select PPEs for PPEs Matrix", [ppe["name"] for ppe in ppe_options])
+            clauses.append((clause, text))
+        elif clause == "Procedure steps":
+            st.markdown(f"**{i+1}. {clause}**")
+            step_editor()
+            # A copy: the stored steps keep changing while a render may still be using these
+            clauses.append((clause, [{"detail": step["detail"], "images": list(step["images"])}
+                                     for step in st.session_state.steps]))
+        else:
+            st.markdown(f"**{i+1}. {clause}**")
+            text = st.text_area(f"{i+1}. {clause}", key=f"clause_{i}")
+            clauses.append((clause, text))
+
+    for i in range(extra_clauses):
+        title = st.text_input(f"Extra Clause {i+1} Title", key=f"extra_title_{i}")
+        body = st.text_area(f"Extra Clause {i+1} Content", key=f"extra_body_{i}")
+        if title:
+            clauses.append((title, body))
+
+    # Footer details
+    prep_by = st.text_input("Prepared By")
+    review_by = st.text_input("Reviewed By")
+    approve_by = st.text_input("Approved By")
+
+    generate_col, preview_col = st.columns(2)
+    submitted = generate_col.form_submit_button("Generate Work Instruction")
+    preview_clicked = preview_col.form_submit_button("Preview pages")
+
+
+def current_spec():
+    return WorkInstructionSpec(
+        title=wi_title,
+        department=department,
+        doc_no=doc_no,
+        issue_date=str(issue_date),
+        rev_no=rev_no,
+        rev_date=str(rev_date),
+        clauses=clauses,
+        ppe_selected=ppe_selected,
+        prep_by=prep_by,
+        review_by=review_by,
+        approve_by=approve_by,
+    )
+
+
+def spec_size(spec):
+    steps = [step for title, content in spec.clauses if title == "Procedure steps" for step in content]
+    images = sum(img is not None for step in steps for img in step["images"])
+    return len(steps), images
+
+
+def render_outputs(spec, digest, job, repo, incremental, owner, replace):
+    # Runs on a render worker thread, so it must not call st.* or touch session state
+    # Already loaded by the warm-up unless Generate was clicked right after startup
+    from wi_output import spooled_output
+    from wi_pdf import render_pdf
+    from wi_render import RenderOptions, build_document
+    from wi_revise import revise_document
+
+    # Set WI_PROFILE=1 (or =cprofile) to time each phase; off by default
+    mode = profiling_mode()
+    profile = RenderProfile(cprofile=mode == "cprofile") if mode else None
+    steps, images = spec_size(spec)
+    # Styled output looks the same as the classic path but reuses cached boilerplate clauses
+    options = RenderOptions(styled=True, profile=profile, progress=job.advance)
+    # Large documents spill to disk; the files are copied into the repository and downloaded from there
+    with profile.run() if profile else nullcontext(), spooled_output() as docx, spooled_output() as pdf:
+        if images:
+            # From here on only print-size copies of the uploaded pictures are referenced
+            job.start_stage("Preparing image", images)
+            with phase(profile, "images"):
+                spec = print_size_pictures(spec, options.image_dpi, job.advance)
+        job.start_stage("Embedding image" if images else "Building document", images)
+        previous = repo.get(spec.doc_no.strip()) if incremental else None
+        if previous is not None and previous["docx_hash"]:
+            doc, reuse = revise_document(repo.load_spec(previous), repo.get_blob(previous["docx_hash"]), spec, options)
+        else:
+            doc, reuse = build_document(spec, options), {}
+        job.start_stage("Saving DOCX")
+        with phase(profile, "save"):
+            doc.save(docx)
+            del doc
+        job.start_stage("Rendering PDF image" if images else "Rendering PDF", images)
+        with phase(profile, "pdf"):
+            render_pdf(spec, options, out=pdf)
+        job.start_stage("Saving to repository")
+        row = repo.save(spec, digest, docx, pdf, owner=owner, replace=replace)
+    rendered = {"digest": digest, "docx_hash": row["docx_hash"], "pdf_hash": row["pdf_hash"], "name": file_stem(spec)}
+    if profile:
+        rendered["profile"] = profile.log(digest=digest[:12], department=spec.department, steps=steps, images=images,
+                                          fragment_cache=fragment_cache_stats(), **reuse)
+        rendered["profile_stats"] = profile.stats_text()
+    return rendered
+
+
+def submit_render(spec, replace=False):
+    # Identical inputs (pictures compared by content) reuse the bytes from the last render
+    digest = spec_digest(spec)
+    rendered = st.session_state.get("rendered")
+    if rendered is not None and rendered["digest"] == digest:
+        return
+    queue = render_queue()
+    repo = repository()
+    owner = session_owner()
+    st.session_state.pop("render_conflict", None)
+    # The suggested number is not reserved; don't silently replace a WI someone else saved under it
+    existing = None if replace else repo.conflict(spec, owner)
+    if existing is not None:
+        st.session_state.render_conflict = dict(existing)
+        return
+    job = st.session_state.get("render_job")
+    if job is not None:
+        # A newer submission supersedes one that is still waiting
+        queue.cancel(job)
+    st.session_state.pop("render_error", None)
+    try:
+        st.session_state.render_job = queue.submit(
+            owner, lambda job: render_outputs(spec, digest, job, repo, incremental, owner, replace))
+    except QueueFull:
+        st.session_state.pop("render_job", None)
+        st.session_state.render_error = SERVER_BUSY
+
+
+def use_doc_no(doc_no):
+    st.session_state.doc_no = doc_no
+    st.session_state.pop("render_conflict", None)
+
+
+def conflict_panel():
+    row = st.session_state.render_conflict
+    st.warning(f"{row['doc_no']} rev {row['rev_no']} is already saved as \"{row['title']}\" ({row['department']}). "
+               "Generating it again would replace that Work Instruction.")
+    next_doc_no = repository().next_doc_no(dept_prefix_map.get(department, ""))
+    use_col, replace_col = st.columns(2)
+    use_col.button(f"Use {next_doc_no} instead", on_click=use_doc_no, args=(next_doc_no,))
+    if replace_col.button(f"Replace {row['doc_no']} rev {row['rev_no']}"):
+        submit_render(current_spec(), replace=True)
+        st.rerun()
+
+
+@st.fragment(run_every=0.5)
+def render_progress():
+    job = st.session_state.get("render_job")
+    if job is None:
+        return
+    if job.finished.is_set():
+        del st.session_state.render_job
+        if job.error:
+            st.session_state.render_error = f"Generating the Work Instruction failed: {job.error}"
+        elif job.result is not None:
+            st.session_state.rendered = job.result
+        st.rerun()
+    if job.state == "queued":
+        ahead = render_queue().waiting_ahead(job)
+        st.progress(0.0, text=f"Queued, {ahead} ahead" if ahead else "Queued, starting shortly")
     else:
-        st.markdown(f"**{i+1}. {clause}**")
-        text = st.text_area(f"{i+1}. {clause}", key=f"clause_{i}")
-        clauses.append((clause, text))
-
-extra_clauses = st.number_input("Add Extra Clauses", min_value=0, max_value=10, step=1)
-for i in range(extra_clauses):
-    title = st.text_input(f"Extra Clause {i+1} Title", key=f"extra_title_{i}")
-    body = st.text_area(f"Extra Clause {i+1} Content", key=f"extra_body_{i}")
-    if title:
-        clauses.append((title, body))
-
-# Footer details
-prep_by = st.text_input("Prepared By")
-review_by = st.text_input("Reviewed By")
-approve_by = st.text_input("Approved By")
-
-
-def create_docx():
-    doc = Document()
-
-    # Set page margins (1.5 cm = 0.59 inches)
-    section = doc.sections[0]
-    section.top_margin = Inches(0.59)
-    section.bottom_margin = Inches(0.59)
-    section.left_margin = Inches(0.65)
-    section.right_margin = Inches(0.59)
-    
-    header = section.header
-    # Remove any extra empty paragraph in header before table
-    if header.paragraphs and not header.paragraphs[0].text.strip():
-        p = header.paragraphs[0]._element
-        p.getparent().remove(p)
-    footer = section.footer
-
-    # Header table (adjusted for margins)
-    # Total width = 8.27 (A4 width) - 0.59*2 (margins) = 7.09 inches
-    table = header.add_table(rows=4, cols=3, width=Inches(7.09))
-    table.style = 'Table Grid'
-    table.autofit = False
-    # Adjust column widths proportionally
-    widths = [Inches(1.5), Inches(3.59), Inches(2.2)]
-    for row in table.rows:
-        for idx, cell in enumerate(row.cells):
-            cell.width = widths[idx]
-
-    # Merge cells for logo
-    logo_cell = table.cell(0, 0)
-    for i in range(1, 4):
-        logo_cell.merge(table.cell(i, 0))
-    paragraph = logo_cell.paragraphs[0]
-    run = paragraph.add_run()
-    if os.path.exists(LOGO_PATH):
-        run.add_picture(LOGO_PATH, width=Inches(1.2))
-
-    # Merge cells for company name
-    name_cell = table.cell(0, 1)
-    name_cell.merge(table.cell(1, 1))
-    paragraph = name_cell.paragraphs[0]
-    run = paragraph.add_run(COMPANY_NAME)
-    run.font.size = Pt(14)  # Larger font for company name
-    run.font.bold = True
-    run.font.name = 'Arial'
-    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-    # Merge cells for SOP title
-    sop_cell = table.cell(2, 1)
-    sop_cell.merge(table.cell(3, 1))
-    paragraph = sop_cell.paragraphs[0]
-    run = paragraph.add_run(f"WORK INSTRUCTION – {wi_title.upper()}")
-    run.font.size = Pt(12)  # Medium font for WI title
-    run.font.bold = True
-    run.font.name = 'Arial'
-    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-    # Column 3 with smaller font
-    for row, text in enumerate([
-        f"DOC. NO: {doc_no}",
-        f"ISSUE NO. / DATE: {rev_no} / {issue_date}",
-        f"REV. NO: {rev_no}",
-        f"REV. DATE: {rev_date}"
-    ]):
-        cell = table.cell(row, 2)
-        paragraph = cell.paragraphs[0]
-        run = paragraph.add_run(text)
-        run.font.size = Pt(9)  # Smaller font for document details
-        run.font.name = 'Arial'
-        run.font.bold = False
-
-    # Vertically center align all header table cells
-    for row in table.rows:
-        for cell in row.cells:
-            tc = cell._tc
-            tcPr = tc.get_or_add_tcPr()
-            vAlign = OxmlElement('w:vAlign')
-            vAlign.set(qn('w:val'), 'center')
-            tcPr.append(vAlign)
-
-    # Increase height of all header rows
-    for row in table.rows:
-        tr = row._tr
-        trPr = tr.get_or_add_trPr()
-        trHeight = OxmlElement('w:trHeight')
-        trHeight.set(qn('w:val'), '300')  # 500 twips ~0.35 cm
-        trHeight.set(qn('w:hRule'), 'exact')
-        trPr.append(trHeight)
-
-
-    # WI title
-    heading = doc.add_paragraph(wi_title)
-    heading.style = doc.styles['Heading 1']
-    # Set font for heading explicitly
-    for run in heading.runs:
-        run.font.name = 'Calibri'
-        r = run._element
-        r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-
-    dept_para = doc.add_paragraph(f"Department: {department}")
-    for run in dept_para.runs:
-        run.font.name = 'Calibri'
-        r = run._element
-        r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-
-    # Clause entries with manual numbering
-    for idx, (title, content) in enumerate(clauses, 1):
-        if title == "Resources required":
-            p = doc.add_paragraph()
-            run = p.add_run(f"{idx}. {title}:")
-            run.bold = True
-            run.font.name = 'Calibri'
-            r = run._element
-            r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-            res_table = doc.add_table(rows=2, cols=3)
-            res_table.style = 'Table Grid'
-            res_table.autofit = True
-            headers = ["Machine", "Material", "Man"]
-            for col, h in enumerate(headers):
-                cell = res_table.cell(0, col)
-                for paragraph in cell.paragraphs:
-                    run = paragraph.add_run(h)
-                    run.bold = True
-                    run.font.name = 'Calibri'
-                    r = run._element
-                    r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-                    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                    paragraph.paragraph_format.space_before = Pt(3)
-                    paragraph.paragraph_format.space_after = Pt(3)
-                tc = cell._tc
-                tcPr = tc.get_or_add_tcPr()
-                vAlign = OxmlElement('w:vAlign')
-                vAlign.set(qn('w:val'), 'center')
-                tcPr.append(vAlign)
-                shd = OxmlElement('w:shd')
-                shd.set(qn('w:fill'), 'B7DEE8')
-                tcPr.append(shd)
-            entries = [content["machine"], content["material"], content["man"]]
-            for col, entry in enumerate(entries):
-                cell = res_table.cell(1, col)
-                cell.text = entry
-                for paragraph in cell.paragraphs:
-                    for run in paragraph.runs:
-                        run.font.name = 'Calibri'
-                        r = run._element
-                        r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-                    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                    paragraph.paragraph_format.space_before = Pt(6)
-                    paragraph.paragraph_format.space_after = Pt(6)
-                tc = cell._tc
-                tcPr = tc.get_or_add_tcPr()
-                vAlign = OxmlElement('w:vAlign')
-                vAlign.set(qn('w:val'), 'center')
-                tcPr.append(vAlign)
-        elif title == "Procedure steps":
-            p = doc.add_paragraph()
-            run = p.add_run(f"{idx}. {title}:")
-            run.bold = True
-            run.font.name = 'Calibri'
-            r = run._element
-            r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-            steps = content
-            proc_table = doc.add_table(rows=1 + len(steps), cols=3)
-            proc_table.style = 'Table Grid'
-            proc_table.autofit = False
-            col_widths = [Inches(1/2.54), Inches(9.5/2.54), Inches(8.05/2.54)]
-            for row in proc_table.rows:
-                for col, cell in enumerate(row.cells):
-                    cell.width = col_widths[col]
-            header_cells = proc_table.rows[0].cells
-            header_cells[0].text = "#"
-            header_cells[1].text = "Detail"
-            header_cells[2].text = "Picture"
-            for col in range(3):
-                for paragraph in header_cells[col].paragraphs:
-                    for run in paragraph.runs:
-                        run.font.name = 'Calibri'
-                        r = run._element
-                        r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-                    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                    run = paragraph.runs[0] if paragraph.runs else paragraph.add_run()
-                    run.bold = True
-                    run.font.name = 'Calibri'
-                    r = run._element
-                    r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-                tc = header_cells[col]._tc
-                tcPr = tc.get_or_add_tcPr()
-                shd = OxmlElement('w:shd')
-                shd.set(qn('w:fill'), 'B7DEE8')
-                tcPr.append(shd)
-            for step_idx, step in enumerate(steps):
-                row_cells = proc_table.rows[step_idx+1].cells
-                row_cells[0].text = str(step_idx+1)
-                for paragraph in row_cells[0].paragraphs:
-                    for run in paragraph.runs:
-                        run.font.name = 'Calibri'
-                        r = run._element
-                        r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-                    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                row_cells[1].text = step["detail"]
-                for paragraph in row_cells[1].paragraphs:
-                    for run in paragraph.runs:
-                        run.font.name = 'Calibri'
-                        r = run._element
-                        r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-                    paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                pic_cell = row_cells[2]
-                for para in pic_cell.paragraphs:
-                    para.clear()
-                for img in step["images"]:
-                    if img is not None:
-                        try:
-                            pic_cell.add_paragraph().add_run().add_picture(img, width=Inches(1.2))
-                        except Exception:
-                            pass
-                for paragraph in pic_cell.paragraphs:
-                    for run in paragraph.runs:
-                        run.font.name = 'Calibri'
-                        r = run._element
-                        r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-                    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        elif idx == 8:  # PPEs matrix clause
-            p = doc.add_paragraph()
-            run = p.add_run(f"{idx}. {title}:")
-            run.bold = True
-            run.font.name = 'Calibri'
-            r = run._element
-            r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-            selected_ppe_objs = [ppe for ppe in ppe_options if ppe["name"] in ppe_selected]
-            if selected_ppe_objs:
-                ppe_table = doc.add_table(rows=2, cols=len(selected_ppe_objs))
-                ppe_table.autofit = True
-                ppe_table.style = 'Table Grid'
-                for col in range(len(selected_ppe_objs)):
-                    for row in range(2):
-                        cell = ppe_table.cell(row, col)
-                        cell.width = Inches(7.09 / max(1, len(selected_ppe_objs)))
-                        for paragraph in cell.paragraphs:
-                            for run in paragraph.runs:
-                                run.font.name = 'Calibri'
-                                r = run._element
-                                r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-                            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                        tc = cell._tc
-                        tcPr = tc.get_or_add_tcPr()
-                        vAlign = OxmlElement('w:vAlign')
-                        vAlign.set(qn('w:val'), 'center')
-                        tcPr.append(vAlign)
-                for col, ppe in enumerate(selected_ppe_objs):
-                    cell = ppe_table.cell(0, col)
-                    if os.path.exists(ppe["image"]):
-                        cell.paragraphs[0].add_run().add_picture(ppe["image"], width=Inches(1))
-                for col, ppe in enumerate(selected_ppe_objs):
-                    cell = ppe_table.cell(1, col)
-                    run = cell.paragraphs[0].add_run(ppe["name"])
-                    run.font.name = 'Calibri'
-                    r = run._element
-                    r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-            else:
-                doc.add_paragraph("No PPEs selected.")
+        st.progress(job.fraction, text=job.message)
+
+
+def show_preview(spec):
+    # Pages are drawn from the PDF layout at low resolution; unchanged pages come from a cache
+    from wi_preview import preview_pages
+
+    with st.spinner("Drawing preview..."):
+        pages, drawn = preview_pages(spec, digest=spec_digest(spec))
+    st.session_state.preview = pages, drawn
+
+
+def preview_panel():
+    preview = st.session_state.get("preview")
+    if preview is None:
+        return
+    pages, drawn = preview
+    with st.expander(f"Preview: {len(pages)} pages ({drawn} redrawn)", expanded=True):
+        cols = st.columns(3)
+        for i, png in enumerate(pages):
+            cols[i % 3].image(png, caption=f"Page {i + 1}")
+
+
+@st.fragment
+def download_buttons():
+    rendered = st.session_state.get("rendered")
+    if rendered is None:
+        return
+    repo = repository()
+    docx_col, pdf_col = st.columns(2)
+    # on_click="ignore" serves the file without rerunning the script; it is read from the repository only then
+    docx_col.download_button("Download DOCX", lambda: repo.get_blob(rendered["docx_hash"]),
+                             file_name=f"{rendered['name']}.docx", on_click="ignore")
+    pdf_col.download_button("Download PDF", lambda: repo.get_blob(rendered["pdf_hash"]),
+                            file_name=f"{rendered['name']}.pdf", mime="application/pdf", on_click="ignore")
+
+
+def debug_panel():
+    rendered = st.session_state.get("rendered")
+    if rendered is None or "profile" not in rendered:
+        return
+    profile = rendered["profile"]
+    with st.expander(f"Debug: render took {profile['total_ms']:.0f} ms"):
+        st.table([{"phase": name, "ms": stats["ms"], "calls": stats["calls"]}
+                  for name, stats in profile["phases"].items()])
+        cache = profile["fragment_cache"]
+        st.caption(f"Clause fragment cache: {cache['hits']} hits, {cache['misses']} misses, "
+                   f"{cache['entries']} fragments ({cache['bytes'] / 1024:.0f} KB)")
+        startup = startup_times()
+        st.caption("Cold start: " + ", ".join(f"{name[:-3].replace('_', ' ')} {ms:.0f} ms" for name, ms in startup.items()))
+        if rendered["profile_stats"]:
+            st.code(rendered["profile_stats"], language=None)
+
+
+def session_owner():
+    # Identifies this session's jobs in the render queue
+    if "owner" not in st.session_state:
+        st.session_state.owner = uuid4().hex
+    return st.session_state.owner
+
+
+def export_department(repo, owner, department, fmt):
+    # Runs on its own thread when the download is clicked. The export takes a render queue slot
+    # like any render, so concurrent exports wait their turn instead of each starting a process pool
+    from wi_export import APP_WORKERS, export_zip
+    from wi_output import spooled_output
+
+    def export(job):
+        # Spawn keeps the export workers from inheriting locks held by the server's threads
+        with spooled_output() as out:
+            export_zip(repo, repo.select(department=department), out, fmt, workers=APP_WORKERS,
+                       mp_context=multiprocessing.get_context("spawn"))
+            # Streamlit serves downloads from memory, so reading the archive once is the only copy
+            out.seek(0)
+            return out.read()
+
+    # Streamlit only reports a failed download; the reasons go to the server log
+    queue = render_queue()
+    try:
+        job = queue.submit(owner, export)
+    except QueueFull:
+        raise RuntimeError(SERVER_BUSY) from None
+    if not job.finished.wait(EXPORT_TIMEOUT):
+        queue.cancel(job)
+        raise RuntimeError(f"The {department} export did not finish within {EXPORT_TIMEOUT} s")
+    if job.error:
+        raise RuntimeError(job.error)
+    return job.result
+
+
+def queue_full():
+    stats = render_queue().stats()
+    return stats["queued"] >= stats["max_queued"]
+
+
+def saved_documents():
+    repo = repository()
+    rows = repo.recent(department)
+    if not rows:
+        return
+    owner = session_owner()
+    with st.expander(f"Saved {department} Work Instructions"):
+        if queue_full():
+            # The export would be refused a queue slot, and the download could only fail without saying why
+            st.caption(SERVER_BUSY)
         else:
-            p = doc.add_paragraph()
-            run = p.add_run(f"{idx}. {title}:")
-            run.bold = True
-            run.font.name = 'Calibri'
-            r = run._element
-            r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-            para = doc.add_paragraph(content)
-            for run in para.runs:
-                run.font.name = 'Calibri'
-                r = run._element
-                r.rPr.rFonts.set(qn('w:eastAsia'), 'Calibri')
-
-    # Add approval table to footer section (3 rows, 4 columns, last column merged)
-    footer_table = footer.add_table(rows=3, cols=4, width=Inches(7.09))
-    footer_table.style = 'Table Grid'
-    # Set column widths
-    footer_widths = [Inches(2.0), Inches(2.0), Inches(2.0), Inches(1.3)]
-    for row in footer_table.rows:
-        for idx, cell in enumerate(row.cells):
-            cell.width = footer_widths[idx]
-
-    # Merge last column for all rows (signature)
-    signature_cell = footer_table.cell(0, 3)
-    for i in range(1, 3):
-        signature_cell.merge(footer_table.cell(i, 3))
-
-    # Center align all cells vertically and horizontally
-    for row in footer_table.rows:
-        for cell in row.cells:
-            for paragraph in cell.paragraphs:
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            tc = cell._tc
-            tcPr = tc.get_or_add_tcPr()
-            vAlign = OxmlElement('w:vAlign')
-            vAlign.set(qn('w:val'), 'center')
-            tcPr.append(vAlign)
-
-    # Increase height of second and third row
-    for row_idx in [1, 2]:
-        tr = footer_table.rows[row_idx]._tr
-        trPr = tr.get_or_add_trPr()
-        trHeight = OxmlElement('w:trHeight')
-        trHeight.set(qn('w:val'), '500')  # 500 twips ~0.35 cm
-        trHeight.set(qn('w:hRule'), 'exact')
-        trPr.append(trHeight)
-
-    # First row: labels
-    for col, label in enumerate(["Prepared By", "Reviewed By", "Approved By"]):
-        cell = footer_table.cell(0, col)
-        cell.text = label
-        for paragraph in cell.paragraphs:
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    # Only set 'Signature' in the first row's merged cell
-    signature_paragraph = footer_table.cell(0, 3).paragraphs[0]
-    signature_paragraph.clear()
-    signature_paragraph.add_run("Signature")
-    signature_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-    # Second row: names from input
-    for col, name in enumerate([prep_by, review_by, approve_by]):
-        cell = footer_table.cell(1, col)
-        cell.text = name
-        for paragraph in cell.paragraphs:
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    # Leave merged cell in second row blank
-    blank_paragraph = footer_table.cell(1, 3).paragraphs[0]
-    blank_paragraph.clear()
-    blank_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-    # Third row: Page x of x using Word fields
-    for col in range(3):
-        footer_table.cell(2, col).text = ""
-    # Insert Word field for page numbering only in merged cell
-    page_paragraph = footer_table.cell(2, 3).paragraphs[0]
-    page_paragraph.clear()
-    run = page_paragraph.add_run("Page ")
-    fldChar1 = OxmlElement('w:fldChar')
-    fldChar1.set(qn('w:fldCharType'), 'begin')
-    instrText1 = OxmlElement('w:instrText')
-    instrText1.text = 'PAGE'
-    fldChar2 = OxmlElement('w:fldChar')
-    fldChar2.set(qn('w:fldCharType'), 'separate')
-    fldChar3 = OxmlElement('w:fldChar')
-    fldChar3.set(qn('w:fldCharType'), 'end')
-    run._r.append(fldChar1)
-    run._r.append(instrText1)
-    run._r.append(fldChar2)
-    run._r.append(fldChar3)
-    run = page_paragraph.add_run(" of ")
-    fldChar1 = OxmlElement('w:fldChar')
-    fldChar1.set(qn('w:fldCharType'), 'begin')
-    instrText1 = OxmlElement('w:instrText')
-    instrText1.text = 'NUMPAGES'
-    fldChar2 = OxmlElement('w:fldChar')
-    fldChar2.set(qn('w:fldCharType'), 'separate')
-    fldChar3 = OxmlElement('w:fldChar')
-    fldChar3.set(qn('w:fldCharType'), 'end')
-    run._r.append(fldChar1)
-    run._r.append(instrText1)
-    run._r.append(fldChar2)
-    run._r.append(fldChar3)
-
-    return doc
-
-
-def generate_download(doc):
-    file_stream = BytesIO()
-    doc.save(file_stream)
-    file_stream.seek(0)
-    return file_stream
-
-
-if st.button("Generate Work Instruction"):
-    document = create_docx()
-    docx_file = generate_download(document)
-    st.download_button("Download DOCX", docx_file, file_name="work_instruction.docx")
+            export_cols = st.columns(2)
+            for col, fmt in zip(export_cols, ["docx", "pdf"]):
+                col.download_button(f"Export all as {fmt.upper()} (ZIP)",
+                                    lambda fmt=fmt: export_department(repo, owner, department, fmt),
+                                    file_name=f"{department}_{fmt}.zip", mime="application/zip",
+                                    key=f"export_{fmt}", on_click="ignore")
+        for row in rows:
+            saved_row(repo, row, row["updated_at"], "saved")
+
+
+def saved_row(repo, row, detail, key):
+    cols = st.columns([4, 1, 1])
+    cols[0].markdown(f"**{row['doc_no']}** rev {row['rev_no']} · {row['title']}  \n{detail}")
+    name = file_stem(WorkInstructionSpec(doc_no=row["doc_no"], rev_no=row["rev_no"]))
+    # Files are read from the object store only when a button is clicked
+    if row["docx_hash"]:
+        cols[1].download_button("DOCX", lambda h=row["docx_hash"]: repo.get_blob(h), file_name=f"{name}.docx",
+                                key=f"{key}_docx_{row['id']}", on_click="ignore")
+    if row["pdf_hash"]:
+        cols[2].download_button("PDF", lambda h=row["pdf_hash"]: repo.get_blob(h), file_name=f"{name}.pdf",
+                                mime="application/pdf", key=f"{key}_pdf_{row['id']}", on_click="ignore")
+
+
+@st.fragment
+def search_documents():
+    # A fragment, so typing a query does not rerun the whole form
+    query = st.text_input("🔍 Search saved Work Instructions", placeholder="Machine, material, hazard, doc number...")
+    if not query.strip():
+        return
+    repo = repository()
+    this_department = st.checkbox(f"Only {department}")
+    rows = repo.search(query, department=department if this_department else None, limit=20, highlight=("**", "**"))
+    if not rows:
+        st.caption("No saved Work Instructions match.")
+    for row in rows:
+        saved_row(repo, row, f"{row['department']} · {row['snippet']}", "search")
+
+
+if submitted:
+    submit_render(current_spec())
+if preview_clicked:
+    show_preview(current_spec())
+preview_panel()
+if "render_error" in st.session_state:
+    st.error(st.session_state.render_error)
+if "render_conflict" in st.session_state:
+    conflict_panel()
+if "render_job" in st.session_state:
+    render_progress()
+else:
+    download_buttons()
+    debug_panel()
+search_documents()
+saved_documents()
+first_page_done()